@@ -1,25 +1,27 @@
 from crewai import Agent
 from crewai.tools import tool
-import requests
-from config import LM_STUDIO_URL, LM_MODEL
+from core.llm_client import get_llm_client
+
+
+def build_messages(prompt: str):
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": prompt}
+    ]
 
 # LM Studio tool
 @tool("call_llm")
 def call_llm(prompt: str) -> str:
     """Call LM Studio LLM with a prompt and return the response."""
-    payload = {
-    "model": LM_MODEL,
-    "messages": [
-        {"role": "system", "content": "You are a helpful assistant."},
-        {"role": "user", "content": prompt}
-    ],
-    "max_tokens": 500,
-    "temperature": 0.0
-}
-    resp = requests.post(LM_STUDIO_URL + 'chat/completions', json=payload)
-    resp.raise_for_status()
-    data = resp.json()
-    return data["choices"][0]["message"]["content"]
+    return get_llm_client().chat(build_messages(prompt), max_tokens=500, temperature=0.0)
+
+def stream_llm(prompt: str):
+    """Streaming variant of call_llm: yields answer tokens as LM Studio produces them."""
+    return get_llm_client().stream_chat(build_messages(prompt), max_tokens=500, temperature=0.0)
+
+async def acall_llm(prompt: str) -> str:
+    """asyncio variant of call_llm."""
+    return await get_llm_client().achat(build_messages(prompt), max_tokens=500, temperature=0.0)
 
 # Create the Answer Agent
 answer_agent = Agent(
@@ -28,4 +30,4 @@ answer_agent = Agent(
     goal="Generate high-quality answers to user queries using LM Studio",
     backstory="This agent receives prompts and returns answers using a local LM Studio model.",
     tools=[call_llm]
-)
\ No newline at end of file
+)
@@ -1,6 +1,12 @@
 # agents/evaluator_agent.py
+import re
+
+import numpy as np
 from crewai import Agent
+from nltk import sent_tokenize
 from agents.answer_agent import call_llm  # LLM tool to judge answers
+from core.embeddings import get_embeddings, ensure_punkt
+from config import EVALUATOR_MODE, EVALUATOR_GROUNDING_WEIGHT
 
 # ---------------------------
 # Evaluator Agent
@@ -14,28 +20,94 @@ evaluator_agent = Agent(
     tools=[]  # no external tools needed besides call_llm which is used in task function
 )
 
+# ---------------------------
+# Scoring helpers
+# ---------------------------
+SCORE_RE = re.compile(r"(\d+(?:\.\d+)?|\.\d+)\s*(%|(?:/|out\s+of)\s*(\d+(?:\.\d+)?))?", re.IGNORECASE)
+# The 0-1 range label from the prompt, in case the model echoes it
+RANGE_RE = re.compile(r"\(?\b0\s*(?:-|to)\s*1(?:\.0)?\b\)?", re.IGNORECASE)
+# "1. ..." / "2) ..." list markers
+LIST_RE = re.compile(r"^\s*\d+[.)]\s+", re.MULTILINE)
+LABEL_RE = re.compile(r"\bscore\b(?:\s+(?:is|of)\b)?[\s:=*]*", re.IGNORECASE)
+
+def parse_score(text):
+    """
+    Score in an LLM reply, scaled to 0-1: the number after the last "Score"
+    label, else the first number outside list markers and an echoed "(0-1)".
+    Handles "0.8", "Score: .75", "8/10", "3 out of 5" and "80%". Returns None
+    if there is no number or it is not a 0-1 score (e.g. a bare "7" or "4/0"),
+    so the caller's fallback applies.
+    """
+    text = LIST_RE.sub("", RANGE_RE.sub(" ", text or ""))
+    match = None
+    for label in LABEL_RE.finditer(text):
+        match = SCORE_RE.match(text, label.end()) or match
+    match = match or SCORE_RE.search(text)
+    if not match:
+        return None
+    value = float(match.group(1))
+    if match.group(2) == "%":
+        value /= 100
+    elif match.group(3):
+        denominator = float(match.group(3))
+        if not denominator:
+            return None
+        value /= denominator
+    return value if 0.0 <= value <= 1.0 else None
+
+def answer_sentences(answer):
+    ensure_punkt()
+    return [s for s in sent_tokenize(answer or "") if s.strip()]
+
+def groundedness(answer, search_results):
+    """
+    Mean over the answer's sentences of their best cosine similarity to a
+    retrieved chunk. Sentences (and chunks lacking a stored vector) are
+    embedded in a single batch.
+    """
+    sentences = answer_sentences(answer)
+    if not sentences or not search_results:
+        return 0.0
+    missing = [d["payload"]["text"] for d in search_results if d.get("vector") is None]
+    vectors = np.asarray(get_embeddings(sentences + missing), dtype=np.float32)
+    sentence_vectors = vectors[:len(sentences)]
+    chunk_vectors = [np.asarray(d["vector"], dtype=np.float32) for d in search_results if d.get("vector") is not None]
+    chunk_vectors = np.vstack(chunk_vectors + [vectors[len(sentences):]])
+
+    def unit(m):
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        return m / np.where(norms == 0, 1.0, norms)
+
+    similarity = unit(sentence_vectors) @ unit(chunk_vectors).T
+    return float(np.clip(similarity.max(axis=1), 0.0, 1.0).mean())
+
 # ---------------------------
 # Evaluation function
 # ---------------------------
-def evaluate_task_fn(query: str, answer: str, search_results: list, context: str):
+def evaluate_task_fn(query: str, answer: str, search_results: list, context: str, mode: str = None):
     """
-    Computes confidence of the answer.
-    Combines max retrieval score with LLM-based judgment.
-    Returns float between 0 and 1.
+    Computes confidence of the answer, a float between 0 and 1.
+
+    mode "embedding" (default, no LLM call): blends how well the answer's
+    sentences are supported by the retrieved chunks with the max retrieval
+    score. mode "llm": max of the retrieval score and an LLM judge's score.
     """
-    # Step 1: Max retrieval score
+    mode = mode or EVALUATOR_MODE
     r_conf = max((d.get("score", 0.0) for d in search_results), default=0.0)
 
-    # Step 2: LLM judge
+    if mode == "embedding":
+        grounded = groundedness(answer, search_results)
+        return EVALUATOR_GROUNDING_WEIGHT * grounded + (1 - EVALUATOR_GROUNDING_WEIGHT) * r_conf
+
+    if mode != "llm":
+        raise ValueError(f"Unknown evaluator mode: {mode!r}")
+
     llm_prompt = (
         f"Rate the following answer 0-1 for correctness and grounding given the context.\n\n"
         f"Context:\n{context}\n\nQuestion: {query}\nAnswer:\n{answer}\nScore (0-1):"
     )
-
     try:
-        llm_score = float(call_llm.run(llm_prompt).strip().split()[0])
+        llm_score = parse_score(call_llm.run(llm_prompt))
     except Exception:
-        llm_score = 0.0
-
-    # Step 3: Return the maximum of retrieval score and LLM judgment
-    return max(r_conf, llm_score)
+        llm_score = None
+    return max(r_conf, llm_score or 0.0)
@@ -4,37 +4,28 @@ from crewai.tools import tool
 import os
 import tempfile
 
-import fitz  # PyMuPDF
-import whisper
-
 from core.qdrant_utils import upsert_to_qdrant as _upsert_to_qdrant
 from core.embeddings import get_embeddings
+from core.pdf_extract import iter_pdf_pages
+from core.transcription import get_whisper_model, iter_transcript_segments
 
 
 # ------------------------------------------------------
-# Load Whisper globally ONCE (fastest approach)
+# PDF Extraction (for uploaded files)
 # ------------------------------------------------------
-WHISPER_MODEL = whisper.load_model("base")
+def pdf_sections(uploaded_file):
+    """Yield (text, metadata) sections of a PDF for core.ingest_pipeline.ingest_stream."""
+    for page_num, text in iter_pdf_pages(uploaded_file):
+        yield text, {"page": page_num}
 
 
-# ------------------------------------------------------
-# PDF Extraction (for uploaded files)
-# ------------------------------------------------------
 @tool("extract_text_from_pdf")
 def extract_text_from_pdf_tool(uploaded_file) -> str:
     """Extract text from a PDF uploaded via Streamlit."""
-    # Save uploaded PDF to a temp file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(uploaded_file.read())
-        temp_path = tmp.name
-
-    text = ""
-    with fitz.open(temp_path) as doc:
-        for page_num, page in enumerate(doc, start=1):
-            text += f"\n--- Page {page_num} ---\n"
-            text += page.get_text("text")
-
-    os.remove(temp_path)
+    text = "".join(
+        f"\n--- Page {page_num} ---\n{page_text}"
+        for page_num, page_text in iter_pdf_pages(uploaded_file)
+    )
     return text.strip()
 
 
@@ -48,18 +39,41 @@ def transcribe_audio_tool(uploaded_file) -> str:
         tmp.write(uploaded_file.read())
         temp_path = tmp.name
 
-    result = WHISPER_MODEL.transcribe(temp_path)
+    result = get_whisper_model().transcribe(temp_path)
     os.remove(temp_path)
     return result["text"].strip()
 
 
+def audio_sections(uploaded_file):
+    """
+    Yield (text, metadata) sections of an audio upload for ingest_stream.
+    Audio is transcribed in silence-delimited segments; each section carries
+    its start/end timestamps (seconds) and is yielded as soon as it is ready.
+    """
+    suffix = os.path.splitext(getattr(uploaded_file, "name", ""))[1] or ".wav"
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        tmp.write(uploaded_file.read())
+        temp_path = tmp.name
+
+    try:
+        for segment in iter_transcript_segments(temp_path):
+            if segment["text"]:
+                yield segment["text"], {"start": segment["start"], "end": segment["end"]}
+    finally:
+        os.remove(temp_path)
+
+
 # ------------------------------------------------------
 # Upsert to Qdrant
 # ------------------------------------------------------
 @tool("upsert_to_qdrant")
-def upsert_to_qdrant_tool(collection: str, texts: list, metadatas: list, embeddings: list):
-    """Upserts text chunks and embeddings into a Qdrant collection."""
-    return _upsert_to_qdrant(collection, texts, metadatas, embeddings)
+def upsert_to_qdrant_tool(collection: str, texts: list, metadatas: list, embeddings: list = None,
+                          prune: bool = True, progress_callback=None):
+    """Incrementally upserts text chunks into a Qdrant collection, embedding only new chunks."""
+    return _upsert_to_qdrant(
+        collection, texts, metadatas, embeddings, prune,
+        progress_callback=progress_callback
+    )
 
 
 # ------------------------------------------------------
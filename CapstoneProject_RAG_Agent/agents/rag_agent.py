@@ -8,7 +8,7 @@ from core.embeddings import get_embeddings
 def query_rag(collection: str, query: str, topk: int = 5):
     """Queries the Qdrant vector database and returns top results."""
     #query_emb = get_embeddings([query])[0]
-    results = qdrant_query(query, topk=topk)
+    results = qdrant_query(query, topk=topk, collection=collection)
     return results
 
 # Create the RAG Agent
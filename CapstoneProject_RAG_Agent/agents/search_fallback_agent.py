@@ -1,14 +1,26 @@
 from crewai import Agent
 from crewai.tools import tool
 import os
+import threading
 import requests
-from config import SERPAPI_API_KEY
+from config import (
+    SERPAPI_API_KEY,
+    WEB_SEARCH_URL,
+    WEB_SEARCH_TIMEOUT,
+    WEB_SEARCH_CACHE_PATH,
+    WEB_SEARCH_CACHE_TTL,
+    WEB_SEARCH_NEGATIVE_TTL,
+    WEB_SEARCH_CACHE_MAX_ENTRIES,
+)
+from core.disk_cache import DiskCache
 
 
-@tool("web_search")
-def web_search(query: str, num: int = 5):
+# ---------------------------
+# Search backends
+# ---------------------------
+def serpapi_search(query: str, num: int = 5):
     """
-    Perform live web search using SerpAPI and return top results.
+    Perform live web search using SerpAPI (or a compatible endpoint at WEB_SEARCH_URL).
     Returns a list of dicts: [{'title':..., 'snippet':..., 'link':...}]
     """
     if not SERPAPI_API_KEY:
@@ -20,7 +32,7 @@ def web_search(query: str, num: int = 5):
         "num": num
     }
 
-    resp = requests.get("https://serpapi.com/search", params=params)
+    resp = requests.get(WEB_SEARCH_URL, params=params, timeout=WEB_SEARCH_TIMEOUT)
     resp.raise_for_status()
     data = resp.json()
 
@@ -34,6 +46,54 @@ def web_search(query: str, num: int = 5):
 
     return results
 
+search_backend = serpapi_search
+
+def set_search_backend(backend):
+    """Replace the search backend, e.g. with a local stand-in for offline tests.
+    backend(query, num) must return the same list-of-dicts shape as serpapi_search."""
+    global search_backend
+    search_backend = backend
+
+
+# ---------------------------
+# Result cache (persistent)
+# ---------------------------
+_web_search_cache = None
+_web_search_cache_lock = threading.Lock()
+
+def get_web_search_cache():
+    """Return the web search result cache, opened on first use."""
+    global _web_search_cache
+    if _web_search_cache is None:
+        with _web_search_cache_lock:
+            if _web_search_cache is None:
+                _web_search_cache = DiskCache(
+                    WEB_SEARCH_CACHE_PATH,
+                    ttl=WEB_SEARCH_CACHE_TTL,
+                    max_entries=WEB_SEARCH_CACHE_MAX_ENTRIES
+                )
+    return _web_search_cache
+
+def _cache_key(query: str, num: int):
+    return f"{num}|{' '.join(query.lower().split())}"
+
+
+@tool("web_search")
+def web_search(query: str, num: int = 5):
+    """
+    Perform live web search and return top results, served from the local
+    cache when the same (normalized) query was searched recently.
+    Returns a list of dicts: [{'title':..., 'snippet':..., 'link':...}]
+    """
+    cache = get_web_search_cache()
+    key = _cache_key(query, num)
+    results = cache.get(key)
+    if results is None:
+        results = search_backend(query, num)
+        # Empty results are cached too, for a shorter time
+        cache.set(key, results, ttl=WEB_SEARCH_CACHE_TTL if results else WEB_SEARCH_NEGATIVE_TTL)
+    return results
+
 # Create the Search Fallback Agent
 search_fallback_agent = Agent(
     name="SearchFallback",
@@ -42,4 +102,3 @@ search_fallback_agent = Agent(
     backstory="This agent queries the web using SerpAPI to provide additional context when RAG fails.",
     tools=[web_search]
 )
-
@@ -0,0 +1,313 @@
+# api.py
+"""
+Headless HTTP API over the conditional RAG pipeline (aiohttp).
+
+    python api.py            # serves on API_HOST:API_PORT
+
+POST /query    {"query": "...", "collection": optional, "stream": optional bool}
+               -> the kickoff result as JSON, or with "stream": true a
+               text/event-stream of "token" events followed by one "result"
+               event (the result's answer is authoritative: after a web
+               fallback the streamed tokens include the first draft).
+               Identical concurrent queries share one pipeline run; an
+               unknown collection is a 404.
+POST /ingest   multipart "file" (PDF / audio) or JSON {"source", "text"}
+               -> 202 {"job", "status"}; the same content is ingested once,
+               creating the collection if needed.
+GET  /ingest/{job}  -> {"job", "name", "status", "counts" | "error"}
+               (the last API_INGEST_JOBS_KEPT finished jobs are remembered)
+GET  /health, GET /metrics (Prometheus text format)
+"""
+import asyncio
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from agents.extractor_agent import pdf_sections, audio_sections
+from core.ingest_pipeline import ingest_stream
+from core.qdrant_utils import ensure_collection, collection_exists
+from core.crew_rag_pipeline_conditional import (
+    ConditionalRAGCrew,
+    BackendLimits,
+    answer_agent,
+    improver_agent,
+    search_fallback_agent,
+    rag_agent,
+    evaluator_agent,
+    retrieve_task,
+    draft_task,
+    improve_task,
+    webfallback_task,
+    evaluate_task
+)
+from core.tracing import registry
+from config import (
+    QDRANT_COLLECTION,
+    KICKOFF_CONCURRENCY,
+    INGEST_BACKGROUND_WORKERS,
+    API_HOST,
+    API_PORT,
+    API_MAX_UPLOAD_MB,
+    API_INGEST_JOBS_KEPT,
+)
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a")
+
+
+# ---------------------------
+# Pipeline runs (coalesced)
+# ---------------------------
+class InFlightQuery:
+    """
+    One pipeline execution shared by every concurrent caller of the same
+    query. Streamed tokens are kept so late subscribers can replay them.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.tokens = []
+        self.subscribers = []
+        self.task = None
+
+    def publish(self, token):
+        # Called from the pipeline's worker thread
+        self.loop.call_soon_threadsafe(self._fan_out, token)
+
+    def _fan_out(self, token):
+        self.tokens.append(token)
+        for queue in self.subscribers:
+            queue.put_nowait(token)
+
+    def subscribe(self):
+        queue = asyncio.Queue()
+        for token in self.tokens:
+            queue.put_nowait(token)
+        self.subscribers.append(queue)
+        return queue
+
+
+class QueryService:
+    def __init__(self, concurrency=KICKOFF_CONCURRENCY):
+        self.limits = BackendLimits()
+        self.gate = asyncio.Semaphore(concurrency)
+        self.crews = {}
+        self.in_flight = {}
+
+    def crew(self, collection):
+        if collection not in self.crews:
+            self.crews[collection] = ConditionalRAGCrew(
+                collection=collection,
+                agents=[answer_agent, improver_agent, search_fallback_agent, rag_agent, evaluator_agent],
+                tasks=[retrieve_task, draft_task, improve_task, webfallback_task, evaluate_task]
+            )
+        return self.crews[collection]
+
+    async def _run(self, run, collection, query, stream):
+        async with self.gate:
+            on_token = run.publish if stream else None
+            return await self.crew(collection).akickoff(query, self.limits, on_token=on_token)
+
+    def submit(self, collection, query, stream=False):
+        """Return the in-flight run for this query, starting one if needed."""
+        key = (collection, " ".join(query.split()))
+        run = self.in_flight.get(key)
+        if run is None:
+            run = InFlightQuery(asyncio.get_running_loop())
+            run.task = asyncio.ensure_future(self._run(run, collection, query, stream))
+            self.in_flight[key] = run
+            run.task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return run
+
+
+# ---------------------------
+# Ingestion jobs (deduplicated by content hash)
+# ---------------------------
+def _ingest(collection, name, data=None, text=None):
+    ensure_collection(collection)
+    if text is not None:
+        sections = [(text, {})]
+    else:
+        upload = io.BytesIO(data)
+        upload.name = name
+        ext = os.path.splitext(name)[1].lower()
+        sections = audio_sections(upload) if ext in AUDIO_EXTENSIONS else pdf_sections(upload)
+    return ingest_stream(collection, sections, name)
+
+
+class IngestService:
+    def __init__(self, workers=INGEST_BACKGROUND_WORKERS, keep=API_INGEST_JOBS_KEPT):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self.keep = keep
+        self.jobs = {}
+
+    def _evict(self):
+        """Forget the oldest finished jobs beyond `keep`; running jobs are never dropped."""
+        excess = len(self.jobs) - self.keep
+        for job_id in [j for j, job in self.jobs.items() if job["future"].done()][:max(excess, 0)]:
+            del self.jobs[job_id]
+
+    def submit(self, collection, name, data=None, text=None):
+        content = data if data is not None else text.encode("utf-8")
+        job_id = hashlib.sha256(collection.encode("utf-8") + b"\0" + name.encode("utf-8") + b"\0" + content).hexdigest()
+        job = self.jobs.get(job_id)
+        if job is None or (job["future"].done() and job["future"].exception() is not None):
+            future = self.executor.submit(_ingest, collection, name, data, text)
+            self.jobs.pop(job_id, None)
+            job = self.jobs[job_id] = {"name": name, "future": future}
+            self._evict()
+        return job_id, job
+
+    @staticmethod
+    def describe(job_id, job):
+        future = job["future"]
+        out = {"job": job_id, "name": job["name"]}
+        if not future.done():
+            return {**out, "status": "running"}
+        if future.exception() is not None:
+            return {**out, "status": "failed", "error": f"{type(future.exception()).__name__}: {future.exception()}"}
+        return {**out, "status": "done", "counts": future.result()}
+
+
+# ---------------------------
+# Handlers
+# ---------------------------
+def _json_default(value):
+    # numpy scalars / arrays in results (e.g. hit vectors)
+    return value.tolist() if hasattr(value, "tolist") else str(value)
+
+def _json_response(data, status=200):
+    return web.json_response(data, status=status, dumps=lambda d: json.dumps(d, default=_json_default))
+
+async def _json_body(request):
+    """The request body as a JSON object, or 400."""
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text="Body must be JSON")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="Body must be a JSON object")
+    return body
+
+def _collection(body):
+    collection = body.get("collection") or QDRANT_COLLECTION
+    if not isinstance(collection, str):
+        raise web.HTTPBadRequest(text="'collection' must be a string")
+    return collection
+
+async def handle_query(request):
+    body = await _json_body(request)
+    query = body.get("query")
+    query = query.strip() if isinstance(query, str) else ""
+    if not query:
+        raise web.HTTPBadRequest(text="'query' is required")
+    collection = _collection(body)
+    stream = bool(body.get("stream"))
+    if not await asyncio.to_thread(collection_exists, collection):
+        raise web.HTTPNotFound(text=f"Unknown collection {collection!r}")
+
+    run = request.app["queries"].submit(collection, query, stream)
+    if not stream:
+        try:
+            return _json_response(await asyncio.shield(run.task))
+        except Exception as e:
+            return _json_response({"error": f"{type(e).__name__}: {e}"}, status=500)
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+    tokens = run.subscribe()
+
+    async def send(event, data):
+        await response.write(f"event: {event}\ndata: {json.dumps(data, default=_json_default)}\n\n".encode("utf-8"))
+
+    while True:
+        token_wait = asyncio.ensure_future(tokens.get())
+        done, _ = await asyncio.wait({token_wait, run.task}, return_when=asyncio.FIRST_COMPLETED)
+        if token_wait in done:
+            await send("token", token_wait.result())
+            continue
+        token_wait.cancel()
+        break
+    while not tokens.empty():
+        await send("token", tokens.get_nowait())
+
+    try:
+        result = run.task.result()
+        if not run.tokens:
+            # Cached answer or a run started without streaming
+            await send("token", result["answer"])
+        await send("result", result)
+    except Exception as e:
+        await send("error", {"error": f"{type(e).__name__}: {e}"})
+    await response.write_eof()
+    return response
+
+async def handle_ingest(request):
+    ingest = request.app["ingest"]
+    if request.content_type.startswith("multipart/"):
+        reader = await request.multipart()
+        collection, name, data = QDRANT_COLLECTION, None, None
+        async for part in reader:
+            if part.name == "collection":
+                collection = (await part.text()) or QDRANT_COLLECTION
+            elif part.name == "file":
+                name, data = part.filename, await part.read()
+        if data is None or not name:
+            raise web.HTTPBadRequest(text="multipart field 'file' is required")
+        if os.path.splitext(name)[1].lower() not in (".pdf",) + AUDIO_EXTENSIONS:
+            raise web.HTTPUnsupportedMediaType(text="Unsupported file type")
+        job_id, job = ingest.submit(collection, name, data=data)
+    else:
+        body = await _json_body(request)
+        source, text = body.get("source"), body.get("text")
+        if not (isinstance(source, str) and source and isinstance(text, str) and text):
+            raise web.HTTPBadRequest(text="'source' and 'text' are required")
+        job_id, job = ingest.submit(_collection(body), source, text=text)
+    return _json_response(IngestService.describe(job_id, job), status=202)
+
+async def handle_ingest_status(request):
+    job_id = request.match_info["job"]
+    job = request.app["ingest"].jobs.get(job_id)
+    if job is None:
+        raise web.HTTPNotFound(text="Unknown job")
+    return _json_response(IngestService.describe(job_id, job))
+
+async def handle_health(request):
+    return _json_response({"status": "ok"})
+
+async def handle_metrics(request):
+    return web.Response(text=registry.expose(), content_type="text/plain", charset="utf-8")
+
+
+# ---------------------------
+# Application
+# ---------------------------
+async def _on_startup(app):
+    queries = QueryService()
+    # Enough worker threads for every backend slot (plus query embedding) to be busy at once
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=queries.limits.total + KICKOFF_CONCURRENCY)
+    )
+    app["queries"] = queries
+    app["ingest"] = IngestService()
+
+async def _on_cleanup(app):
+    app["ingest"].executor.shutdown(wait=False)
+
+def create_app():
+    app = web.Application(client_max_size=API_MAX_UPLOAD_MB * 1024 * 1024)
+    app.router.add_post("/query", handle_query)
+    app.router.add_post("/ingest", handle_ingest)
+    app.router.add_get("/ingest/{job}", handle_ingest_status)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/metrics", handle_metrics)
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), host=API_HOST, port=API_PORT)
@@ -1,13 +1,16 @@
 # app.py
+import hashlib
+import io
 import os
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 from agents.extractor_agent import (
-    extract_text_from_pdf_tool,
-    transcribe_audio_tool,
-    upsert_to_qdrant_tool,
+    pdf_sections,
+    audio_sections,
     extractor_agent
 )
-from core.embeddings import semantic_chunk_text, get_embeddings
+from core.ingest_pipeline import ingest_stream
 from core.crew_rag_pipeline_conditional import (
     ConditionalRAGCrew,
     answer_agent,
@@ -21,29 +24,63 @@ from core.crew_rag_pipeline_conditional import (
     webfallback_task,
     evaluate_task
 )
-from config import QDRANT_COLLECTION
+from core.embeddings import get_embedding_model
+from core.qdrant_utils import get_vector_store
+from core.transcription import get_whisper_model
+from core.tracing import start_metrics_server
+from config import QDRANT_COLLECTION, METRICS_ENABLED, INGEST_BACKGROUND_WORKERS
 
 # ---------------------------
-# Initialize Crew
+# Shared resources (built once per process, reused across reruns and sessions)
 # ---------------------------
-crew = ConditionalRAGCrew(
-    collection=QDRANT_COLLECTION,
-    agents=[
-        extractor_agent,
-        answer_agent,
-        improver_agent,
-        search_fallback_agent,
-        rag_agent,
-        evaluator_agent
-    ],
-    tasks=[
-        retrieve_task,
-        draft_task,
-        improve_task,
-        webfallback_task,
-        evaluate_task
-    ]
-)
+@st.cache_resource
+def get_crew():
+    return ConditionalRAGCrew(
+        collection=QDRANT_COLLECTION,
+        agents=[
+            extractor_agent,
+            answer_agent,
+            improver_agent,
+            search_fallback_agent,
+            rag_agent,
+            evaluator_agent
+        ],
+        tasks=[
+            retrieve_task,
+            draft_task,
+            improve_task,
+            webfallback_task,
+            evaluate_task
+        ]
+    )
+
+@st.cache_resource
+def load_embedding_model():
+    return get_embedding_model()
+
+@st.cache_resource
+def load_vector_store():
+    return get_vector_store()
+
+@st.cache_resource
+def load_whisper_model():
+    return get_whisper_model()
+
+@st.cache_resource
+def get_ingest_executor():
+    return ThreadPoolExecutor(max_workers=INGEST_BACKGROUND_WORKERS, thread_name_prefix="ingest")
+
+@st.cache_resource
+def start_metrics_endpoint():
+    """
+    Serve Prometheus-style metrics on http://METRICS_HOST:METRICS_PORT/metrics,
+    once per process. Returns an error message if the port cannot be bound.
+    """
+    try:
+        start_metrics_server()
+    except OSError as e:
+        return f"Metrics endpoint disabled: {e}"
+    return None
 
 # ---------------------------
 # Streamlit UI
@@ -51,6 +88,14 @@ crew = ConditionalRAGCrew(
 st.set_page_config(page_title="RAG Chatbot", layout="wide")
 st.title("RAG Chatbot with PDF/Audio Upload")
 
+crew = get_crew()
+load_embedding_model()
+load_vector_store()
+if METRICS_ENABLED:
+    metrics_error = start_metrics_endpoint()
+    if metrics_error:
+        st.sidebar.warning(metrics_error)
+
 # Sidebar: file upload
 st.sidebar.header("Upload Documents (PDF / MP3 / WAV)")
 uploaded_file = st.sidebar.file_uploader("Upload a file", type=["pdf", "mp3", "wav", "m4a"])
@@ -58,39 +103,75 @@ uploaded_file = st.sidebar.file_uploader("Upload a file", type=["pdf", "mp3", "w
 # ---------------------------
 # Handle file upload
 # ---------------------------
+# Uploads are keyed by content hash, so reruns (e.g. every "Submit") do not
+# re-ingest the same file; ingestion runs on a background worker and only
+# touches plain data, never Streamlit APIs.
+def ingest_upload(name, data, progress):
+    upload = io.BytesIO(data)
+    upload.name = name
+    if os.path.splitext(name)[1].lower() == ".pdf":
+        # Pages stream straight into chunking / embedding / upsert
+        sections = pdf_sections(upload)
+    else:
+        # Transcribed segments stream into ingestion with their timestamps
+        sections = audio_sections(upload)
+    # Embed & upsert new or changed chunks only
+    return ingest_stream(
+        QDRANT_COLLECTION, sections, name,
+        progress_callback=lambda done, total: progress.update(done=done)
+    )
+
+uploads = st.session_state.setdefault("uploads", {})
+
 if uploaded_file:
     file_ext = os.path.splitext(uploaded_file.name)[1].lower()
-    st.sidebar.success(f"Uploaded {uploaded_file.name}")
-
-    try:
-        if file_ext == ".pdf":
-            text_content = extract_text_from_pdf_tool.run(uploaded_file)
-        elif file_ext in [".mp3", ".wav", ".m4a"]:
-            text_content = transcribe_audio_tool.run(uploaded_file)
-        else:
-            st.error("Unsupported file type")
-            text_content = None
-
-        if text_content:
-            st.sidebar.info(f"Extracted {len(text_content)} characters from the file")
-
-            # Chunk & Embed
-            chunks = semantic_chunk_text(text_content)
-            embeddings = get_embeddings(chunks)
-            metadata = [{"source": uploaded_file.name} for _ in chunks]
-
-            # Upsert to Qdrant
-            upsert_to_qdrant_tool.run(
-                QDRANT_COLLECTION, chunks, metadata, embeddings
-            )
-            st.sidebar.success(f"Inserted {len(chunks)} chunks into Qdrant.")
-
-    except Exception as e:
-        st.error(f"Error processing file: {e}")
+    data = uploaded_file.getvalue()
+    digest = hashlib.sha256(data).hexdigest()
+    job = uploads.get(digest)
+    # A failed ingest is retried when the file is uploaded again (new file_id),
+    # not on every rerun while the same upload stays in the widget
+    retry = (job is not None and job["future"].done() and job["future"].exception() is not None
+             and job["upload_id"] != uploaded_file.file_id)
+
+    if file_ext not in [".pdf", ".mp3", ".wav", ".m4a"]:
+        st.error("Unsupported file type")
+    elif job is None or retry:
+        if file_ext != ".pdf":
+            with st.spinner("Loading Whisper..."):
+                load_whisper_model()
+        progress = {"done": 0}
+        uploads[digest] = {
+            "name": uploaded_file.name,
+            "upload_id": uploaded_file.file_id,
+            "progress": progress,
+            "future": get_ingest_executor().submit(ingest_upload, uploaded_file.name, data, progress),
+        }
+
+for job in uploads.values():
+    future = job["future"]
+    if not future.done():
+        st.sidebar.info(f"Ingesting {job['name']}: {job['progress']['done']} chunks upserted...")
+    elif future.exception() is not None:
+        st.sidebar.error(f"Error processing {job['name']}: {future.exception()}")
+    else:
+        counts = future.result()
+        st.sidebar.success(
+            f"{job['name']}: inserted {counts['added']} chunks into Qdrant "
+            f"({counts['skipped']} unchanged, {counts['deleted']} removed)."
+        )
+if any(not job["future"].done() for job in uploads.values()):
+    st.sidebar.button("Refresh status")
 
 # ---------------------------
 # Chat interface
 # ---------------------------
+STAGE_STATUS = {
+    "retrieve": "Searching RAG...",
+    "draft": "Drafting answer...",
+    "improve": "Improving answer...",
+    "web_search": "Performing Web Search fallback...",
+}
+
 st.header("Ask a Question")
 query = st.text_input("Type your question here:")
 
@@ -102,48 +183,30 @@ if st.button("Submit") and query:
     confidence_placeholder = st.empty()
     origin_placeholder = st.empty()
 
-    try:
-        origin = "RAG"  # default
-
-        # -------------------------
-        # Stage 1: Retrieve
-        # -------------------------
-        status_placeholder.info("Searching RAG...")
-        retrieve_out = crew.retrieve_task_fn(query)
-        context = retrieve_out["context"]
-        search_results = retrieve_out["search_results"]
-        r_conf = max((d.get("score", 0.0) for d in search_results), default=0.0)
-
-        # -------------------------
-        # Stage 2: Draft
-        # -------------------------
-        status_placeholder.info("Drafting answer...")
-        draft_answer = crew.draft_task_fn(query, context)
-
-        # -------------------------
-        # Stage 3: Conditional Improve
-        # -------------------------
-        if r_conf < 0.6:
-            status_placeholder.info("Improving answer...")
-            improved = crew.improve_task_fn(query, context, draft_answer)
-            if improved:
-                draft_answer = improved
-                origin = "Improved Answer"
-            else:
-                status_placeholder.info("Performing Web Search fallback...")
-                fallback_done = crew.webfallback_task_fn(query)
-                if fallback_done:
-                    origin = "Web Search Fallback"
-                    # Re-run retrieval + draft after inserting new web knowledge
-                    retrieve_out = crew.retrieve_task_fn(query)
-                    context = retrieve_out["context"]
-                    search_results = retrieve_out["search_results"]
-                    draft_answer = crew.draft_task_fn(query, context)
+    trace_placeholder = st.empty()
 
-        # -------------------------
-        # Stage 4: Evaluate
-        # -------------------------
-        confidence = crew.evaluate_task_fn(query, draft_answer, search_results, context)
+    try:
+        # Draft answers stream into the answer area
+        streamed = []
+
+        def render_token(token):
+            streamed.append(token)
+            answer_placeholder.markdown("".join(streamed))
+
+        def show_stage(stage):
+            if stage in STAGE_STATUS:
+                status_placeholder.info(STAGE_STATUS[stage])
+            if stage == "redraft":
+                streamed.clear()
+
+        result = crew.kickoff(query, on_token=render_token, threshold=0.6, on_stage=show_stage)
+        draft_answer = result["answer"]
+        sources = result["sources"]
+        confidence = result["confidence"]
+        trace_out = result["trace"]
+        origin = result.get("origin", "RAG")
+        if trace_out["branch"] == "cache":
+            origin = f"Cache ({origin})"
 
         # -------------------------
         # Display results
@@ -153,7 +216,7 @@ if st.button("Submit") and query:
         answer_placeholder.write(draft_answer)
 
         sources_placeholder.subheader("Sources")
-        sources_placeholder.write([d["payload"].get("source", "unknown") for d in search_results])
+        sources_placeholder.write(sources)
 
         confidence_placeholder.subheader("Confidence")
         confidence_placeholder.write(confidence)
@@ -161,5 +224,12 @@ if st.button("Submit") and query:
         origin_placeholder.subheader("Answer Origin")
         origin_placeholder.write(origin)
 
+        with trace_placeholder.expander(f"Trace: {trace_out['branch']}, {trace_out['total_ms'] / 1000:.2f}s"):
+            st.table([
+                {"stage": sp["stage"], "ms": sp["duration_ms"],
+                 **{k: v for k, v in sp.items() if k not in ("stage", "start_ms", "duration_ms")}}
+                for sp in trace_out["spans"]
+            ])
+
     except Exception as e:
         status_placeholder.error(f"Error while answering: {e}")
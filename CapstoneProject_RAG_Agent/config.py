@@ -2,8 +2,131 @@ QDRANT_URL = 'http://localhost:6333'
 QDRANT_API_KEY = None
 QDRANT_COLLECTION = 'my_collection'
 
+# Vector store backend (core/vector_store.py)
+# "qdrant": the Qdrant server at QDRANT_URL; "local": an embedded NumPy index
+# (memory-mapped vectors + SQLite payloads) under LOCAL_INDEX_PATH, no server needed.
+VECTOR_BACKEND = 'qdrant'
+LOCAL_INDEX_PATH = 'data/vector_index'
+
+# Qdrant index tuning (core/vector_store.QdrantVectorStore)
+# Index options apply when a collection is created; HNSW_EF and the
+# quantization search options are sent with every query. None = Qdrant default.
+# Compare settings on your own data with tools/index_report.py.
+VECTOR_QUANTIZATION = None  # None, 'scalar' (int8, ~4x less vector RAM) or 'binary' (~32x, weak on 384-dim)
+QUANTIZATION_ALWAYS_RAM = True  # keep quantized vectors in RAM when the originals are on disk
+QUANTIZATION_RESCORE = True  # re-rank quantized candidates with the original vectors
+QUANTIZATION_OVERSAMPLING = 2.0  # candidates fetched = limit * oversampling before rescoring
+HNSW_M = None  # graph degree (Qdrant default 16)
+HNSW_EF_CONSTRUCT = None  # build-time beam width (Qdrant default 100)
+HNSW_EF = None  # search-time beam width; higher = better recall, slower
+VECTORS_ON_DISK = False  # memory-map original vectors instead of holding them in RAM
+
 LM_STUDIO_URL = 'Enter-Local-LMStudio-URL'
 LM_MODEL = 'Enter-Model'
 LM_Text_Model = 'llama-3.2-3b-instruct:2'
 LM_STUDIO_TRANSCRIBE_URL = ''
 SERPAPI_API_KEY = 'Enter-Your-Key'
+
+# Query embedding cache (core/embeddings.embed_query)
+QUERY_EMBEDDING_CACHE_SIZE = 2048
+QUERY_EMBEDDING_CACHE_TTL = 3600  # seconds, None = never expire
+
+# Embedding micro-batching (core/embedding_batcher.py)
+EMBED_MICROBATCHING = True  # coalesce concurrent embed calls into one forward pass
+EMBED_MAX_BATCH = 64  # texts per coalesced pass; larger requests run as-is
+EMBED_BATCH_WAIT_MS = 2  # how long to wait for more requests to join a pass
+
+# Semantic answer cache (core/answer_cache.py)
+ANSWER_CACHE_SIZE = 256
+ANSWER_CACHE_SIMILARITY = 0.95  # cosine similarity needed for a cache hit
+ANSWER_CACHE_TTL = 24 * 3600  # seconds, None = never expire
+
+# Bulk upserts (core/qdrant_utils.upsert_points)
+QDRANT_UPSERT_BATCH_SIZE = 256  # points per request
+QDRANT_UPSERT_PARALLEL = 4  # concurrent in-flight batches
+QDRANT_UPSERT_RETRIES = 3  # retries per failed batch
+
+# Streaming ingestion (core/ingest_pipeline.py)
+INGEST_EMBED_BATCH_SIZE = 64  # chunks per embedding pass
+INGEST_QUEUE_SIZE = 4  # embedding batches buffered between stages
+INGEST_BACKGROUND_WORKERS = 1  # uploads ingested at once by app.py
+
+# PDF extraction (agents/extractor_agent.iter_pdf_pages)
+PDF_EXTRACT_WORKERS = None  # processes, None = os.cpu_count()
+PDF_PAGES_PER_TASK = 16  # pages per worker task
+PDF_PARALLEL_MIN_PAGES = 32  # smaller documents are extracted in-process
+
+# Audio transcription (core/transcription.py)
+WHISPER_MODEL_NAME = "base"
+AUDIO_TRANSCRIBE_WORKERS = 2  # each worker holds its own Whisper model
+AUDIO_SEGMENT_SECONDS = 30  # preferred segment length, cut at the nearest silence
+AUDIO_MIN_SEGMENT_SECONDS = 10
+AUDIO_MAX_SEGMENT_SECONDS = 60
+AUDIO_SILENCE_THRESHOLD = 0.01  # frame RMS below this counts as silence
+
+# LLM client (core/llm_client.py)
+LLM_CONNECT_TIMEOUT = 5  # seconds
+LLM_READ_TIMEOUT = 120  # seconds
+LLM_MAX_RETRIES = 3
+LLM_RETRY_BACKOFF = 0.5  # base seconds, exponential with jitter
+LLM_MAX_CONCURRENCY = 4  # requests in flight to LM Studio
+LLM_POOL_SIZE = 8  # keep-alive connections
+
+# LLM response cache (core/llm_client.py); only temperature-0 calls are cached
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = 'data/llm_cache.sqlite'
+LLM_CACHE_TTL = None  # seconds; None = keep until evicted
+LLM_CACHE_MAX_ENTRIES = 20000
+
+# Speculative web fallback: start web search + snippet embedding alongside
+# draft/improve when retrieval confidence is low
+SPECULATIVE_FALLBACK = True
+SPECULATIVE_FALLBACK_WORKERS = 4
+
+# Batched async kickoff (ConditionalRAGCrew.kickoff_many)
+KICKOFF_CONCURRENCY = 16  # queries in flight
+QDRANT_CONCURRENCY = 8  # concurrent retrieval / upsert stages
+WEB_CONCURRENCY = 4  # concurrent web searches
+
+# Web search fallback (agents/search_fallback_agent.py)
+WEB_SEARCH_URL = 'https://serpapi.com/search'  # point at a local stand-in for offline runs
+WEB_SEARCH_TIMEOUT = 15  # seconds
+WEB_SEARCH_CACHE_PATH = 'data/web_search_cache.sqlite'
+WEB_SEARCH_CACHE_TTL = 24 * 3600  # seconds
+WEB_SEARCH_NEGATIVE_TTL = 3600  # seconds to remember empty results
+WEB_SEARCH_CACHE_MAX_ENTRIES = 5000
+
+# Hybrid dense + sparse (BM25-style) retrieval (core/qdrant_utils.py)
+# New collections get a "dense" and a "sparse" named vector when enabled;
+# collections created without sparse vectors keep using dense-only search.
+HYBRID_SEARCH = True
+HYBRID_PREFETCH = 20  # candidates per search before rank fusion
+HYBRID_RRF_K = 60  # reciprocal-rank-fusion constant
+# Added to the confidence of the top sparse hit when it contains every term of
+# a query naming an identifier (e.g. "XR-5"), which dense cosine under-scores
+HYBRID_IDENTIFIER_BONUS = 0.1
+
+# Prompt context assembly (core/context_packer.py)
+CONTEXT_CANDIDATES = 10  # hits retrieved before diversity selection
+CONTEXT_MAX_CHUNKS = 5  # chunks placed in the prompt at most
+CONTEXT_TOKEN_BUDGET = 1200  # estimated prompt tokens for the context
+CONTEXT_MMR_LAMBDA = 0.7  # 1 = pure relevance, 0 = pure diversity
+CONTEXT_DUPLICATE_THRESHOLD = 0.92  # cosine above which a chunk counts as a near-duplicate
+CONTEXT_CHARS_PER_TOKEN = 4  # token estimate for the context budget
+
+# Answer confidence (agents/evaluator_agent.py)
+# "embedding": answer sentences vs retrieved chunk vectors, no LLM call;
+# "llm": an extra LM Studio call acting as judge.
+EVALUATOR_MODE = 'embedding'
+EVALUATOR_GROUNDING_WEIGHT = 0.7  # confidence = w * groundedness + (1 - w) * best retrieval score
+
+# Tracing + metrics (core/tracing.py)
+METRICS_ENABLED = True  # app.py serves Prometheus-style metrics at /metrics
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9464
+
+# Headless HTTP API (api.py)
+API_HOST = '127.0.0.1'
+API_PORT = 8080
+API_MAX_UPLOAD_MB = 200
+API_INGEST_JOBS_KEPT = 1000  # finished ingest jobs remembered for status lookups
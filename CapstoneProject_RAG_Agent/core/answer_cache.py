@@ -0,0 +1,88 @@
+# core/answer_cache.py
+import threading
+import time
+
+import numpy as np
+
+from config import ANSWER_CACHE_SIZE, ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_TTL
+
+
+# ----------------------------------------------------
+# Semantic answer cache
+# ----------------------------------------------------
+class SemanticAnswerCache:
+    """
+    Caches final pipeline results keyed by query embedding.
+    A lookup hits when a stored query for the same collection has cosine
+    similarity >= threshold with the new query. Entries are evicted LRU once
+    max_size is reached, expire after ttl seconds, and are dropped whenever
+    the collection changes.
+    """
+
+    def __init__(self, max_size=256, threshold=0.95, ttl=None):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = []  # [collection, unit vector, result, stored_at, last_used]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def lookup(self, collection, query_vector):
+        """Return a copy of the cached result for a similar query, or None."""
+        q = self._unit(query_vector)
+        now = time.monotonic()
+        with self._lock:
+            if self.ttl is not None:
+                self._entries = [e for e in self._entries if now - e[3] < self.ttl]
+            candidates = [e for e in self._entries if e[0] == collection]
+            if candidates:
+                sims = np.stack([e[1] for e in candidates]) @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    entry = candidates[best]
+                    entry[4] = now
+                    self.hits += 1
+                    return dict(entry[2])
+            self.misses += 1
+            return None
+
+    def store(self, collection, query_vector, result):
+        now = time.monotonic()
+        with self._lock:
+            self._entries.append([collection, self._unit(query_vector), dict(result), now, now])
+            if len(self._entries) > self.max_size:
+                self._entries.sort(key=lambda e: e[4])
+                del self._entries[: len(self._entries) - self.max_size]
+
+    def invalidate(self, collection=None):
+        """Drop cached answers for a collection (or all collections)."""
+        with self._lock:
+            if collection is None:
+                self._entries.clear()
+            else:
+                self._entries = [e for e in self._entries if e[0] != collection]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+
+answer_cache = SemanticAnswerCache(
+    max_size=ANSWER_CACHE_SIZE,
+    threshold=ANSWER_CACHE_SIMILARITY,
+    ttl=ANSWER_CACHE_TTL
+)
@@ -0,0 +1,106 @@
+# core/context_packer.py
+import math
+
+import numpy as np
+
+from config import (
+    CONTEXT_MAX_CHUNKS,
+    CONTEXT_TOKEN_BUDGET,
+    CONTEXT_MMR_LAMBDA,
+    CONTEXT_DUPLICATE_THRESHOLD,
+    CONTEXT_CHARS_PER_TOKEN,
+)
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+
+def estimate_tokens(text):
+    """Cheap prompt-token estimate (the local LLM's tokenizer is not available here)."""
+    return math.ceil(len(text) / CONTEXT_CHARS_PER_TOKEN)
+
+
+def _truncate_to_tokens(text, tokens):
+    return text[:tokens * CONTEXT_CHARS_PER_TOKEN]
+
+
+def _unit_vectors(hits):
+    """Row-normalised hit vectors; hits without a vector get a zero row (never 'similar')."""
+    dim = next((len(h["vector"]) for h in hits if h.get("vector") is not None), 1)
+    matrix = np.zeros((len(hits), dim), dtype=np.float32)
+    for i, hit in enumerate(hits):
+        if hit.get("vector") is not None:
+            matrix[i] = hit["vector"]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+# ----------------------------------------------------
+# Context assembly
+# ----------------------------------------------------
+def pack_context(hits, max_chunks=None, token_budget=None, mmr_lambda=None, duplicate_threshold=None):
+    """
+    Build the prompt context from retrieval hits ({"payload", "score", "vector"}).
+
+    Chunks are picked by maximal marginal relevance: each step takes the hit
+    with the best mix of its relevance and dissimilarity to what is already
+    selected. Relevance is the fused "rrf_score" (scaled so the best hit is
+    1) when every hit has one, else "score". Hits whose vector is within duplicate_threshold cosine
+    of a selected one (or whose text is identical) are dropped, and packing
+    stops at max_chunks or when token_budget would be exceeded; the first
+    chunk is truncated rather than dropped if it alone is over budget.
+
+    Returns {"hits", "context", "stats"}; stats compares the packed context
+    with joining the top max_chunks hits as-is.
+    """
+    max_chunks = max_chunks or CONTEXT_MAX_CHUNKS
+    token_budget = token_budget or CONTEXT_TOKEN_BUDGET
+    mmr_lambda = CONTEXT_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    duplicate_threshold = duplicate_threshold or CONTEXT_DUPLICATE_THRESHOLD
+
+    rank_key = "rrf_score" if hits and all(h.get("rrf_score") is not None for h in hits) else "score"
+    hits = sorted(hits, key=lambda h: h.get(rank_key, 0.0), reverse=True)
+    baseline = estimate_tokens(CONTEXT_SEPARATOR.join(h["payload"]["text"] for h in hits[:max_chunks]))
+    stats = {"candidates": len(hits), "selected": 0, "duplicates": 0, "over_budget": 0,
+             "tokens_baseline": baseline, "tokens_packed": 0, "tokens_saved": baseline}
+    if not hits:
+        return {"hits": [], "context": "", "stats": stats}
+
+    vectors = _unit_vectors(hits)
+    relevance = np.array([h.get(rank_key, 0.0) for h in hits], dtype=np.float32)
+    if rank_key == "rrf_score":
+        relevance /= relevance.max() or 1.0
+    max_similarity = np.zeros(len(hits), dtype=np.float32)
+    remaining = set(range(len(hits)))
+    separator_tokens = estimate_tokens(CONTEXT_SEPARATOR)
+
+    selected, texts, seen_texts, used = [], [], set(), 0
+    while remaining and len(selected) < max_chunks:
+        order = sorted(remaining)
+        mmr = mmr_lambda * relevance[order] - (1 - mmr_lambda) * max_similarity[order]
+        i = order[int(np.argmax(mmr))]
+        remaining.discard(i)
+
+        text = hits[i]["payload"]["text"]
+        if text in seen_texts or (selected and max_similarity[i] >= duplicate_threshold):
+            stats["duplicates"] += 1
+            continue
+
+        cost = estimate_tokens(text) + (separator_tokens if selected else 0)
+        if used + cost > token_budget:
+            if selected:
+                stats["over_budget"] += 1
+                continue
+            text = _truncate_to_tokens(text, token_budget)
+            cost = estimate_tokens(text)
+
+        selected.append(hits[i])
+        texts.append(text)
+        seen_texts.add(hits[i]["payload"]["text"])
+        used += cost
+        max_similarity = np.maximum(max_similarity, vectors @ vectors[i])
+
+    context = CONTEXT_SEPARATOR.join(texts)
+    stats["selected"] = len(selected)
+    stats["tokens_packed"] = estimate_tokens(context)
+    stats["tokens_saved"] = max(0, baseline - stats["tokens_packed"])
+    return {"hits": selected, "context": context, "stats": stats}
@@ -5,13 +5,16 @@ from agents.answer_agent import call_llm  # tool object
 from agents.improver_agent import improve_answer  # tool object
 from agents.search_fallback_agent import web_search  # tool object
 from core.embeddings import get_embeddings
+from core.context_packer import pack_context
+from config import CONTEXT_CANDIDATES
 
 class RAGQueryTask(Task):
     def run(self, query: str, collection: str):
 
         # Step 1: Query Qdrant
-        search_results = query_rag.run(collection=collection, query=query)
-        context = "\n\n---\n\n".join([d["payload"]["text"] for d in search_results])
+        candidates = query_rag.run(collection=collection, query=query, topk=CONTEXT_CANDIDATES)
+        packed = pack_context(candidates)
+        search_results, context = packed["hits"], packed["context"]
 
         # Step 2: Draft answer
         draft_prompt = (
@@ -57,11 +60,11 @@ class RAGQueryTask(Task):
             embeddings = get_embeddings(snippets)
 
             # Insert fallback search results into RAG
-            upsert_to_qdrant_tool.run(collection, snippets, metas, embeddings)
+            upsert_to_qdrant_tool.run(collection, snippets, metas, embeddings, False)
 
             # Re-query with new knowledge
-            search_results = query_rag.run(collection=collection, query=query)
-            context = "\n\n---\n\n".join([d["payload"]["text"] for d in search_results])
+            packed = pack_context(query_rag.run(collection=collection, query=query, topk=CONTEXT_CANDIDATES))
+            search_results, context = packed["hits"], packed["context"]
 
             final_prompt = (
                 f"You are an assistant. Use the context to answer:\n\n{context}\n\n"
@@ -1,52 +1,341 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 from crewai import Crew, Task
 from pydantic import Field
 
 # Import your existing agents and tools
 from agents.rag_agent import rag_agent, query_rag
-from agents.answer_agent import answer_agent, call_llm
+from agents.answer_agent import answer_agent, call_llm, stream_llm
 from agents.improver_agent import improver_agent, improve_answer
 from agents.search_fallback_agent import search_fallback_agent, web_search
 from agents.extractor_agent import extractor_agent, upsert_to_qdrant_tool
-from agents.evaluator_agent import evaluator_agent
-from core.embeddings import get_embeddings
+from agents.evaluator_agent import evaluator_agent, evaluate_task_fn
+from core.embeddings import get_embeddings, embed_query
+from core.answer_cache import answer_cache
+from core.context_packer import pack_context
+from core.qdrant_utils import rrf_scores
+from core.tracing import Trace, add_llm_tokens
+from config import (
+    EVALUATOR_MODE,
+    CONTEXT_CANDIDATES,
+    CONTEXT_MAX_CHUNKS,
+    SPECULATIVE_FALLBACK,
+    SPECULATIVE_FALLBACK_WORKERS,
+    KICKOFF_CONCURRENCY,
+    QDRANT_CONCURRENCY,
+    LLM_MAX_CONCURRENCY,
+    WEB_CONCURRENCY,
+)
 
 # ---------------------------
 # Task functions
 # ---------------------------
+def cached_answer_fn(query, collection):
+    """Return a previously computed result for a near-identical query, or None."""
+    return answer_cache.lookup(collection, embed_query(query))
+
+def store_answer_fn(query, collection, result, after=None):
+    """
+    Cache a final result. If `after` (a Future for a pending insert) is given,
+    the result is stored once it completes, so the insert's cache
+    invalidation does not immediately drop it.
+    """
+    if after is None:
+        answer_cache.store(collection, embed_query(query), result)
+    else:
+        after.add_done_callback(lambda _: answer_cache.store(collection, embed_query(query), result))
+
 def retrieve_task_fn(query, collection):
-    results = query_rag.run(collection=collection, query=query)
-    context = "\n\n---\n\n".join([d["payload"]["text"] for d in results])
-    return {"search_results": results, "context": context}
+    """
+    Retrieve CONTEXT_CANDIDATES hits and pack a diverse, token-budgeted
+    subset into the context. "candidates" keeps every hit for merging.
+    """
+    candidates = query_rag.run(collection=collection, query=query, topk=CONTEXT_CANDIDATES)
+    packed = pack_context(candidates)
+    return {
+        "search_results": packed["hits"],
+        "context": packed["context"],
+        "context_stats": packed["stats"],
+        "candidates": candidates,
+        "query_vector": embed_query(query)
+    }
 
-def draft_task_fn(query, context):
+def draft_task_fn(query, context, on_token=None):
+    """Draft an answer; with on_token, the answer is streamed and each token is passed to it."""
     prompt = f"You are an assistant. Use the context to answer:\n\n{context}\n\nQuestion: {query}"
-    return call_llm.run(prompt)
+    if on_token is None:
+        return call_llm.run(prompt)
+    tokens = []
+    for token in stream_llm(prompt):
+        tokens.append(token)
+        on_token(token)
+    return "".join(tokens)
 
 def improve_task_fn(query, context, draft):
     improved = improve_answer.run(query=query, docs=context, draft=draft)
     return improved if "INSUFFICIENT" not in improved else None
 
-def webfallback_task_fn(query, collection):
+def fetch_fallback_fn(query, cancel=None):
+    """Web search + snippet embedding, without touching the collection."""
     web_results = web_search.run(query=query)
-    if not web_results:
+    web_results = [r for r in web_results or [] if r.get("snippet")]
+    if not web_results or (cancel is not None and cancel.is_set()):
         return None
     snippets = [r["snippet"] for r in web_results]
     metas = [{"source": r.get("link", "unknown")} for r in web_results]
     embeddings = get_embeddings(snippets)
-    upsert_to_qdrant_tool.run(collection, snippets, metas, embeddings)
+    return {"texts": snippets, "metadatas": metas, "embeddings": embeddings}
+
+def commit_fallback_fn(collection, fetched):
+    """Insert fetched web snippets into the collection."""
+    if not fetched:
+        return None
+    upsert_to_qdrant_tool.run(collection, fetched["texts"], fetched["metadatas"], fetched["embeddings"], False)
     return True
 
-def evaluate_task_fn(query, answer, search_results, context):
-    r_conf = max((d.get("score", 0.0) for d in search_results), default=0.0)
-    llm_prompt = (
-        f"Rate the following answer 0-1 for correctness and grounding given the context.\n\n"
-        f"Context:\n{context}\n\nQuestion: {query}\nAnswer:\n{answer}\nScore (0-1):"
-    )
+# ---------------------------
+# Background web fallback work (speculative fetches, inserts)
+# ---------------------------
+_fallback_pool = ThreadPoolExecutor(
+    max_workers=SPECULATIVE_FALLBACK_WORKERS,
+    thread_name_prefix="web-fallback"
+)
+
+def webfallback_task_fn(query, collection):
+    """
+    Fetch web snippets and insert them into the collection in the background.
+    Returns the fetched snippets with their embeddings, plus the pending
+    insert under "pending_insert", or None if the search found nothing.
+    """
+    fetched = fetch_fallback_fn(query)
+    if not fetched:
+        return None
+    return {**fetched, "pending_insert": _fallback_pool.submit(commit_fallback_fn, collection, fetched)}
+
+def merge_fallback_fn(retrieve_out, fetched, topk=CONTEXT_MAX_CHUNKS):
+    """
+    Score fetched web snippets against the already-computed query vector and
+    repack them with the first retrieval's candidates, instead of
+    re-querying Qdrant. If the local hits were hybrid-fused, the merged
+    hits are re-fused from the first retrieval's order and the dense order of
+    all merged hits, so web snippets and local hits share one ranking.
+    """
+    query_vector = np.asarray(retrieve_out["query_vector"], dtype=np.float32)
+    vectors = np.asarray(fetched["embeddings"], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+    scores = vectors @ query_vector / np.where(norms == 0, 1.0, norms)
+
+    web_hits = [
+        {"payload": {**meta, "text": text}, "score": float(score), "vector": vector}
+        for text, meta, score, vector in zip(fetched["texts"], fetched["metadatas"], scores, vectors)
+    ]
+    local = retrieve_out.get("candidates", retrieve_out["search_results"])
+    if local and all(h.get("rrf_score") is not None for h in local):
+        local = sorted(local, key=lambda h: h["rrf_score"], reverse=True)
+        merged = local + web_hits
+        dense_order = sorted(range(len(merged)), key=lambda i: merged[i].get("dense_score", merged[i]["score"]),
+                             reverse=True)
+        fused = rrf_scores([range(len(local)), dense_order])
+        candidates = [{**hit, "rrf_score": fused[i]} for i, hit in enumerate(merged)]
+    else:
+        candidates = local + web_hits
+    packed = pack_context(candidates, max_chunks=topk)
+    return {
+        "search_results": packed["hits"],
+        "context": packed["context"],
+        "context_stats": packed["stats"],
+        "candidates": candidates,
+        "query_vector": retrieve_out["query_vector"]
+    }
+
+def _retrieve_attrs(span, retrieve_out, top_score=None):
+    """Trace attributes of a retrieval / merge stage."""
+    stats = retrieve_out["context_stats"]
+    span["hits"] = stats["selected"]
+    span["candidates"] = stats["candidates"]
+    span["context_tokens"] = stats["tokens_packed"]
+    span["tokens_saved"] = stats["tokens_saved"]
+    if top_score is not None:
+        span["top_score"] = top_score
+
+# ---------------------------
+# Async execution helpers
+# ---------------------------
+class BackendLimits:
+    """Per-backend concurrency limits shared by concurrent akickoff calls."""
+
+    def __init__(self, qdrant=QDRANT_CONCURRENCY, llm=LLM_MAX_CONCURRENCY, web=WEB_CONCURRENCY):
+        self.qdrant = asyncio.Semaphore(qdrant)
+        self.llm = asyncio.Semaphore(llm)
+        self.web = asyncio.Semaphore(web)
+        self.total = qdrant + llm + web
+
+async def _run_limited(limit, fn, *args, **kwargs):
+    """Run a blocking stage function in a worker thread under a backend limit."""
+    async with limit:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+# ---------------------------
+# Stage sequence (shared by kickoff, akickoff and app.py)
+# ---------------------------
+ORIGINS = {
+    "high_confidence": "RAG",
+    "no_fallback_results": "RAG",
+    "improved": "Improved Answer",
+    "web_fallback": "Web Search Fallback",
+}
+
+def _stages(query, collection, threshold=0.8, on_token=None, on_stage=None):
+    """
+    The conditional pipeline, written once for every driver. A generator
+    that yields (op, backend, fn, args) requests and is sent each result:
+    op "run" calls fn(*args); "start" begins it in the background and sends
+    back a handle (a Future or asyncio Task); "wait" (fn is such a handle)
+    waits for it. backend names the BackendLimits slot, or None for no
+    limit. Stage errors are thrown back in, so spans record them. Returns
+    the result with its trace. on_stage(name) is called as each stage
+    starts; on_token streams draft answers.
+    """
+    trace = Trace()
+
+    def stage(name, **attrs):
+        if on_stage is not None:
+            on_stage(name)
+        return trace.span(name, **attrs)
+
+    # -------------------------
+    # Stage 0: Answer cache (in memory, so outside the Qdrant limit)
+    # -------------------------
+    with stage("embed"):
+        yield "run", None, embed_query, (query,)
+    with stage("cache") as span:
+        cached = yield "run", None, cached_answer_fn, (query, collection)
+        span["hit"] = cached is not None
+    if cached is not None:
+        return {**cached, "trace": trace.finish("cache")}
+
+    # -------------------------
+    # Stage 1: Retrieve
+    # -------------------------
+    with stage("retrieve") as span:
+        retrieve_out = yield "run", "qdrant", retrieve_task_fn, (query, collection)
+        context = retrieve_out["context"]
+        search_results = retrieve_out["search_results"]
+        r_conf = max((d.get("score", 0.0) for d in search_results), default=0.0)
+        _retrieve_attrs(span, retrieve_out, r_conf)
+
+    # Low confidence: prefetch the web fallback while draft/improve run
+    cancel = threading.Event()
+    prefetch = None
+    if r_conf < threshold and SPECULATIVE_FALLBACK:
+        prefetch = yield "start", "web", fetch_fallback_fn, (query, cancel)
+    pending_insert = None
+    branch = "high_confidence"
     try:
-        llm_score = float(call_llm.run(llm_prompt).strip().split()[0])
-    except Exception:
-        llm_score = 0.0
-    return max(r_conf, llm_score)
+        # -------------------------
+        # Stage 2: Draft
+        # -------------------------
+        with stage("draft") as span:
+            draft_answer = yield "run", "llm", draft_task_fn, (query, context, on_token)
+            add_llm_tokens(span, [context, query], draft_answer)
+
+        # -------------------------
+        # Stage 3: Conditional Improve, then web fallback
+        # -------------------------
+        if r_conf < threshold:
+            with stage("improve") as span:
+                improved = yield "run", "llm", improve_task_fn, (query, context, draft_answer)
+                add_llm_tokens(span, [context, query, draft_answer], improved)
+            if improved:
+                draft_answer = improved
+                branch = "improved"
+            else:
+                branch = "no_fallback_results"
+                with stage("web_search", speculative=prefetch is not None) as span:
+                    if prefetch is not None:
+                        fetched = yield "wait", None, prefetch, ()
+                    else:
+                        fetched = yield "run", "web", fetch_fallback_fn, (query,)
+                    span["results"] = len(fetched["texts"]) if fetched else 0
+                if fetched:
+                    # Insert in the background, merge in memory + redraft
+                    branch = "web_fallback"
+                    pending_insert = _fallback_pool.submit(commit_fallback_fn, collection, fetched)
+                    with stage("merge") as span:
+                        retrieve_out = yield "run", None, merge_fallback_fn, (retrieve_out, fetched)
+                        context = retrieve_out["context"]
+                        search_results = retrieve_out["search_results"]
+                        _retrieve_attrs(span, retrieve_out)
+                    with stage("redraft") as span:
+                        draft_answer = yield "run", "llm", draft_task_fn, (query, context, on_token)
+                        add_llm_tokens(span, [context, query], draft_answer)
+    finally:
+        if prefetch is not None and not prefetch.done():
+            cancel.set()
+            prefetch.cancel()
+
+    # -------------------------
+    # Stage 4: Evaluate
+    # -------------------------
+    with stage("evaluate", mode=EVALUATOR_MODE) as span:
+        backend = "llm" if EVALUATOR_MODE == "llm" else None
+        confidence = yield "run", backend, evaluate_task_fn, (query, draft_answer, search_results, context)
+        span["confidence"] = confidence
+        if EVALUATOR_MODE == "llm":
+            add_llm_tokens(span, [context, query, draft_answer], "0.0")
+
+    result = {
+        "answer": draft_answer,
+        "sources": [d["payload"].get("source", "unknown") for d in search_results],
+        "confidence": confidence,
+        "origin": ORIGINS[branch],
+        "context_stats": retrieve_out["context_stats"]
+    }
+    store_answer_fn(query=query, collection=collection, result=result, after=pending_insert)
+    return {**result, "trace": trace.finish(branch)}
+
+def _drive(stages):
+    """Run a _stages generator in the calling thread (background work on _fallback_pool)."""
+    value, error = None, None
+    while True:
+        try:
+            op, backend, fn, args = stages.send(value) if error is None else stages.throw(error)
+        except StopIteration as done:
+            return done.value
+        value, error = None, None
+        try:
+            if op == "start":
+                value = _fallback_pool.submit(fn, *args)
+            elif op == "wait":
+                value = fn.result()
+            else:
+                value = fn(*args)
+        except BaseException as e:
+            error = e
+
+async def _adrive(stages, limits):
+    """Run a _stages generator with each stage in a worker thread under its backend limit."""
+    value, error = None, None
+    while True:
+        try:
+            op, backend, fn, args = stages.send(value) if error is None else stages.throw(error)
+        except StopIteration as done:
+            return done.value
+        value, error = None, None
+        try:
+            if op == "start":
+                value = asyncio.ensure_future(_run_limited(getattr(limits, backend), fn, *args))
+            elif op == "wait":
+                value = await fn
+            elif backend is None:
+                value = await asyncio.to_thread(fn, *args)
+            else:
+                value = await _run_limited(getattr(limits, backend), fn, *args)
+        except BaseException as e:
+            error = e
 
 # ---------------------------
 # Task objects (metadata for Crew)
@@ -92,11 +381,17 @@ evaluate_task = Task(
 class ConditionalRAGCrew(Crew):
     collection: str = Field(..., description="Qdrant collection to query")
 
+    def cached_answer_fn(self, query):
+        return cached_answer_fn(query, self.collection)
+
+    def store_answer_fn(self, query, result, after=None):
+        return store_answer_fn(query, self.collection, result, after)
+
     def retrieve_task_fn(self, query):
         return retrieve_task_fn(query, self.collection)
 
-    def draft_task_fn(self, query, context):
-        return draft_task_fn(query, context)
+    def draft_task_fn(self, query, context, on_token=None):
+        return draft_task_fn(query, context, on_token)
 
     def improve_task_fn(self, query, context, draft):
         return improve_task_fn(query, context, draft)
@@ -104,46 +399,56 @@ class ConditionalRAGCrew(Crew):
     def webfallback_task_fn(self, query):
         return webfallback_task_fn(query, self.collection)
 
+    def merge_fallback_fn(self, retrieve_out, fetched):
+        return merge_fallback_fn(retrieve_out, fetched)
+
     def evaluate_task_fn(self, query, answer, search_results, context):
         return evaluate_task_fn(query, answer, search_results, context)
 
-    def kickoff(self, query: str):
-        # -------------------------
-        # Stage 1: Retrieve
-        # -------------------------
-        retrieve_out = retrieve_task_fn(query=query, collection=self.collection)
-        context = retrieve_out["context"]
-        search_results = retrieve_out["search_results"]
-        r_conf = max((d.get("score", 0.0) for d in search_results), default=0.0)
+    def kickoff(self, query: str, on_token=None, threshold=0.8, on_stage=None):
+        """
+        Run the conditional pipeline for one query. Retrieval confidence below
+        threshold takes the improve / web-fallback path. If on_token is given,
+        draft answers are streamed to it token by token; on_stage(name) is
+        called as each stage starts. The result carries a per-stage trace
+        under "trace" and how the answer was produced under "origin".
+        """
+        return _drive(_stages(query, self.collection, threshold, on_token, on_stage))
 
-        # -------------------------
-        # Stage 2: Draft
-        # -------------------------
-        draft_answer = draft_task_fn(query=query, context=context)
+    async def akickoff(self, query: str, limits=None, on_token=None, threshold=0.8):
+        """
+        asyncio variant of kickoff. Each stage runs in a worker thread under
+        the matching backend limit (Qdrant, LM Studio, web search), so many
+        queries can overlap their I/O. Span times include waiting for a slot.
+        on_token, if given, is called from the worker thread.
+        """
+        return await _adrive(_stages(query, self.collection, threshold, on_token), limits or BackendLimits())
 
-        # -------------------------
-        # Stage 3: Conditional Improve
-        # -------------------------
-        if r_conf < 0.8:
-            improved = improve_task_fn(query=query, context=context, draft=draft_answer)
-            if improved:
-                draft_answer = improved
-            else:
-                fallback_done = webfallback_task_fn(query=query, collection=self.collection)
-                if fallback_done:
-                    # Re-run retrieval + draft
-                    retrieve_out = retrieve_task_fn(query=query, collection=self.collection)
-                    context = retrieve_out["context"]
-                    search_results = retrieve_out["search_results"]
-                    draft_answer = draft_task_fn(query=query, context=context)
+    async def akickoff_many(self, queries, concurrency=KICKOFF_CONCURRENCY, limits=None):
+        """
+        Run many queries concurrently. Results come back in input order; a
+        failing query yields {"query", "error"} instead of aborting the batch.
+        """
+        limits = limits or BackendLimits()
+        gate = asyncio.Semaphore(concurrency)
 
-        # -------------------------
-        # Stage 4: Evaluate
-        # -------------------------
-        confidence = evaluate_task_fn(query=query, answer=draft_answer, search_results=search_results, context=context)
+        async def run_one(query):
+            async with gate:
+                try:
+                    return await self.akickoff(query, limits)
+                except Exception as e:
+                    return {"query": query, "error": f"{type(e).__name__}: {e}"}
+
+        return await asyncio.gather(*(run_one(q) for q in queries))
+
+    def kickoff_many(self, queries, concurrency=KICKOFF_CONCURRENCY, limits=None):
+        """Synchronous entry point for akickoff_many (e.g. nightly regression sets)."""
+        async def main():
+            backend_limits = limits or BackendLimits()
+            # Enough worker threads for every backend slot to be busy at once
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(max_workers=backend_limits.total)
+            )
+            return await self.akickoff_many(queries, concurrency, backend_limits)
 
-        return {
-            "answer": draft_answer,
-            "sources": [d["payload"].get("source", "unknown") for d in search_results],
-            "confidence": confidence
-        }
+        return asyncio.run(main())
@@ -0,0 +1,94 @@
+# core/embedding_batcher.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+# ----------------------------------------------------
+# Micro-batching dispatcher for the embedding model
+# ----------------------------------------------------
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent embedding requests into one forward pass.
+
+    Callers block in embed(texts). A single dispatcher thread takes the first
+    waiting request, adds whatever else is already queued, then keeps
+    collecting for up to max_wait seconds or until max_batch texts are
+    gathered (a request that would overflow waits for the next batch), runs
+    embed_fn once over the (deduplicated) texts and hands each caller its
+    own slice. Requests arriving while a pass is running
+    form the next batch, so under load batches fill without extra waiting.
+    Requests of max_batch texts or more are already batched and run
+    directly in the caller's thread.
+    """
+
+    def __init__(self, embed_fn, max_batch=64, max_wait=0.002):
+        self.embed_fn = embed_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.texts = 0
+        self._queue = queue.Queue()
+        self._carry = None  # dispatcher thread only
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def embed(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        if len(texts) >= self.max_batch:
+            return self.embed_fn(texts)
+        self._ensure_dispatcher()
+        future = Future()
+        self._queue.put((texts, future))
+        return future.result()
+
+    def _ensure_dispatcher(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._dispatch, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        # A request that would have overflowed the previous batch starts this one
+        batch = [self._carry if self._carry is not None else self._queue.get()]
+        self._carry = None
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get_nowait() if timeout <= 0 else self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if size + len(item[0]) > self.max_batch:
+                self._carry = item
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _dispatch(self):
+        while True:
+            batch = self._collect()
+            unique = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+            try:
+                vectors = dict(zip(unique, self.embed_fn(unique)))
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(unique)
+            for texts, future in batch:
+                future.set_result([vectors[text] for text in texts])
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch": self.texts / self.batches if self.batches else 0.0,
+        }
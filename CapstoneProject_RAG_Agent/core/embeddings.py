@@ -1,29 +1,111 @@
 # embeddings_utils.py
+import threading
+
 import nltk
-nltk.download('punkt')  # corrected from 'punkt_tab'
 from nltk import sent_tokenize
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
+
+from config import (
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_TTL,
+    EMBED_MICROBATCHING,
+    EMBED_MAX_BATCH,
+    EMBED_BATCH_WAIT_MS,
+)
+from core.cache import LRUCache
+from core.embedding_batcher import EmbeddingBatcher
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# ----------------------------------------------------
+# Local embedding model (shared, loaded on first use)
+# ----------------------------------------------------
+_embedding_model = None
+_embedding_lock = threading.Lock()
+
+
+def get_embedding_model():
+    """
+    Return the process-wide HuggingFaceEmbeddings instance.
+    The model is loaded on the first call and reused by retrieval and ingestion.
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_lock:
+            if _embedding_model is None:
+                from langchain_community.embeddings import HuggingFaceEmbeddings
+                _embedding_model = HuggingFaceEmbeddings(
+                    model_name=EMBEDDING_MODEL_NAME,
+                    model_kwargs={"device": "cpu"},
+                    encode_kwargs={"normalize_embeddings": True}
+                )
+    return _embedding_model
+
+
+# ----------------------------------------------------
+# NLTK sentence tokenizer data (downloaded on first use)
+# ----------------------------------------------------
+_punkt_ready = False
+_punkt_lock = threading.Lock()
+
+
+def ensure_punkt():
+    """Make sure the NLTK punkt data is available, downloading it only if missing."""
+    global _punkt_ready
+    if _punkt_ready:
+        return
+    with _punkt_lock:
+        if _punkt_ready:
+            return
+        try:
+            nltk.data.find("tokenizers/punkt")
+        except LookupError:
+            nltk.download("punkt", quiet=True)  # corrected from 'punkt_tab'
+        _punkt_ready = True
 
 # ----------------------------------------------------
-# Local embedding model
+# Embedding requests (micro-batched across threads)
 # ----------------------------------------------------
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2",
-    model_kwargs={"device": "cpu"},
-    encode_kwargs={"normalize_embeddings": True}
+# all-MiniLM-L6-v2 embeds queries and documents identically, so both go
+# through embed_documents and can share a batch.
+embedding_batcher = EmbeddingBatcher(
+    lambda texts: get_embedding_model().embed_documents(texts),
+    max_batch=EMBED_MAX_BATCH,
+    max_wait=EMBED_BATCH_WAIT_MS / 1000
 )
 
+
 def get_embeddings(texts):
     """
     Generate embeddings locally using HuggingFaceEmbeddings.
-    Supports single string or list of strings.
+    Supports single string or list of strings. Concurrent calls are
+    coalesced into shared forward passes when EMBED_MICROBATCHING is on.
     """
     if isinstance(texts, str):
         texts = [texts]
 
-    embeddings = embedding_model.embed_documents(texts)
-    return embeddings
+    if EMBED_MICROBATCHING:
+        return embedding_batcher.embed(texts)
+    return get_embedding_model().embed_documents(texts)
+
+# ----------------------------------------------------
+# Query embeddings (memoized)
+# ----------------------------------------------------
+query_embedding_cache = LRUCache(
+    max_size=QUERY_EMBEDDING_CACHE_SIZE,
+    ttl=QUERY_EMBEDDING_CACHE_TTL
+)
+
+
+def embed_query(query):
+    """
+    Embed a search query, reusing the cached vector for repeated query text.
+    """
+    vector = query_embedding_cache.get(query)
+    if vector is None:
+        vector = get_embeddings([query])[0]
+        query_embedding_cache.set(query, vector)
+    return vector
 
 # ----------------------------------------------------
 # Chunking text
@@ -44,6 +126,7 @@ def chunk_text(text, chunk_size=1000, chunk_overlap=200):
 # Optional: sentence-based chunking (semantic chunks)
 # ----------------------------------------------------
 def semantic_chunk_text(text, max_tokens=1000):
+    ensure_punkt()
     sentences = sent_tokenize(text)
     chunks, current = [], []
     current_len = 0
@@ -0,0 +1,146 @@
+# core/ingest_pipeline.py
+import queue
+import threading
+
+from config import INGEST_EMBED_BATCH_SIZE, INGEST_QUEUE_SIZE
+from core.embeddings import get_embeddings, semantic_chunk_text
+from core.answer_cache import answer_cache
+from core.qdrant_utils import (
+    make_point, make_point_id, existing_point_ids, source_point_ids, delete_points, upsert_points
+)
+
+_DONE = object()
+
+
+# ----------------------------------------------------
+# Queue helpers
+# ----------------------------------------------------
+def _put(q, item, stop):
+    """Blocking put that gives up once the pipeline is being torn down."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _drain(q, stop):
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _DONE:
+            return
+        yield item
+
+
+# ----------------------------------------------------
+# Streaming ingestion
+# ----------------------------------------------------
+def ingest_stream(collection, sections, source, prune=True, embed_batch_size=None,
+                  queue_size=None, progress_callback=None, **upsert_options):
+    """
+    Streams a document into Qdrant: sections -> chunks -> embedding batches -> upserts.
+
+    `sections` is an iterable of (text, metadata) pairs, e.g. one per PDF page;
+    it is consumed lazily. Chunking, embedding and upserting run as overlapping
+    stages connected by bounded queues, so memory stays flat and the first
+    chunks are searchable while the rest of the document is still processed.
+    Chunks already stored (same content-addressed ID) are not re-embedded.
+
+    progress_callback(done, None) is called from the calling thread as
+    batches land. Returns {"added": int, "skipped": int, "deleted": int}.
+    """
+    embed_batch_size = embed_batch_size or INGEST_EMBED_BATCH_SIZE
+    queue_size = queue_size or INGEST_QUEUE_SIZE
+
+    chunk_q = queue.Queue(maxsize=queue_size * embed_batch_size)
+    point_q = queue.Queue(maxsize=queue_size * embed_batch_size)
+    stop = threading.Event()
+    errors = []
+    seen_ids = set()
+    counts = {"added": 0, "skipped": 0, "deleted": 0}
+
+    def chunk_stage():
+        try:
+            for text, metadata in sections:
+                for chunk in semantic_chunk_text(text):
+                    if chunk.strip() and not _put(chunk_q, (chunk, {**metadata, "source": source}), stop):
+                        return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(chunk_q, _DONE, stop)
+
+    def embed_stage():
+        def flush(batch):
+            ids = [make_point_id(source, chunk) for chunk, _ in batch]
+            existing = existing_point_ids(collection, ids)
+            fresh = []
+            for point_id, (chunk, metadata) in zip(ids, batch):
+                if point_id in existing or point_id in seen_ids:
+                    counts["skipped"] += 1
+                else:
+                    fresh.append((point_id, chunk, metadata))
+                seen_ids.add(point_id)
+            if not fresh:
+                return True
+            vectors = get_embeddings([chunk for _, chunk, _ in fresh])
+            for (point_id, chunk, metadata), vector in zip(fresh, vectors):
+                point = make_point(collection, point_id, chunk, vector, metadata)
+                if not _put(point_q, point, stop):
+                    return False
+            counts["added"] += len(fresh)
+            return True
+
+        try:
+            batch = []
+            for item in _drain(chunk_q, stop):
+                batch.append(item)
+                if len(batch) == embed_batch_size:
+                    if not flush(batch):
+                        return
+                    batch = []
+            if batch:
+                flush(batch)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(point_q, _DONE, stop)
+
+    workers = [
+        threading.Thread(target=chunk_stage, daemon=True),
+        threading.Thread(target=embed_stage, daemon=True),
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        upsert_points(
+            collection, _drain(point_q, stop),
+            progress_callback=progress_callback, **upsert_options
+        )
+    except Exception:
+        stop.set()
+        raise
+    finally:
+        for worker in workers:
+            worker.join()
+        if counts["added"]:
+            answer_cache.invalidate(collection)
+
+    if errors:
+        raise errors[0]
+
+    if prune:
+        deleted = source_point_ids(collection, source) - seen_ids
+        delete_points(collection, deleted)
+        counts["deleted"] = len(deleted)
+        if deleted:
+            answer_cache.invalidate(collection)
+
+    return counts
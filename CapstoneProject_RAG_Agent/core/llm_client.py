@@ -0,0 +1,184 @@
+# core/llm_client.py
+import asyncio
+import contextlib
+import hashlib
+import json
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    LM_STUDIO_URL,
+    LM_MODEL,
+    LLM_CONNECT_TIMEOUT,
+    LLM_READ_TIMEOUT,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF,
+    LLM_MAX_CONCURRENCY,
+    LLM_POOL_SIZE,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL,
+    LLM_CACHE_MAX_ENTRIES,
+)
+from core.disk_cache import DiskCache
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMRequestError(RuntimeError):
+    """Raised when the LLM server keeps failing after all retries."""
+
+
+# ----------------------------------------------------
+# OpenAI-compatible chat client (LM Studio)
+# ----------------------------------------------------
+class LLMClient:
+    """
+    Reusable client for the LM Studio chat/completions endpoint.
+    Keeps a pooled keep-alive session, applies connect/read timeouts,
+    retries transient failures with jittered exponential backoff and caps
+    the number of requests in flight to the local server.
+
+    With a cache, temperature-0 completions are served from it: the key is
+    a hash of the model, messages and sampling parameters. Pass
+    use_cache=False to chat / stream_chat to force a fresh generation.
+    """
+
+    def __init__(self, base_url=LM_STUDIO_URL, model=LM_MODEL,
+                 connect_timeout=LLM_CONNECT_TIMEOUT, read_timeout=LLM_READ_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, backoff=LLM_RETRY_BACKOFF,
+                 max_concurrency=LLM_MAX_CONCURRENCY, pool_size=LLM_POOL_SIZE, cache=None):
+        self.url = base_url + "chat/completions"
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.cache = cache
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def build_payload(self, messages, max_tokens=500, temperature=0.0, **params):
+        return {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            **params
+        }
+
+    def _sleep_before_retry(self, attempt):
+        # Full jitter: uniform in [0, backoff * 2^attempt]
+        time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def post(self, payload, stream=False):
+        """
+        POST a payload, retrying connection errors, timeouts and 429/5xx responses.
+        A non-streaming request holds a concurrency slot for its duration; for
+        stream=True the caller must hold one until the response is closed.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                with contextlib.nullcontext() if stream else self._slots:
+                    resp = self.session.post(self.url, json=payload, timeout=self.timeout, stream=stream)
+                if resp.status_code not in RETRY_STATUS_CODES:
+                    resp.raise_for_status()
+                    return resp
+                error = LLMRequestError(f"LLM server returned HTTP {resp.status_code}")
+                resp.close()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt < self.max_retries:
+                self._sleep_before_retry(attempt)
+        raise LLMRequestError(f"LLM request failed after {self.max_retries + 1} attempts") from error
+
+    def _cache_key(self, payload, use_cache):
+        """Content-addressed key, or None if this request must not be cached."""
+        if not use_cache or self.cache is None or payload.get("temperature") != 0:
+            return None
+        keyed = {k: v for k, v in payload.items() if k != "stream"}
+        blob = json.dumps(keyed, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def chat(self, messages, use_cache=True, **params):
+        """Send a chat completion request and return the message content."""
+        payload = self.build_payload(messages, **params)
+        key = self._cache_key(payload, use_cache)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        data = self.post(payload).json()
+        content = data["choices"][0]["message"]["content"]
+        if key is not None:
+            self.cache.set(key, content)
+        return content
+
+    def stream_chat(self, messages, use_cache=True, **params):
+        """
+        Stream a chat completion (OpenAI-compatible `stream: true`) and yield
+        content tokens as they arrive. A concurrency slot is held until the
+        stream is fully consumed or closed. A cached completion is yielded as
+        a single chunk; a streamed one is cached only if read to the end.
+        """
+        payload = self.build_payload(messages, stream=True, **params)
+        key = self._cache_key(payload, use_cache)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        tokens = []
+        # One slot from before the POST until the stream is closed
+        with self._slots, self.post(payload, stream=True) as resp:
+            # SSE is UTF-8 by spec; requests would guess ISO-8859-1 without a charset
+            for raw in resp.iter_lines():
+                line = raw.decode("utf-8")
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                token = choices[0].get("delta", {}).get("content")
+                if token:
+                    tokens.append(token)
+                    yield token
+        if key is not None:
+            self.cache.set(key, "".join(tokens))
+
+    def cache_stats(self):
+        """Hit/miss statistics of the response cache, or None without one."""
+        return self.cache.stats() if self.cache is not None else None
+
+    async def achat(self, messages, **params):
+        """asyncio entry point for chat(); runs the blocking call in a worker thread."""
+        return await asyncio.to_thread(self.chat, messages, **params)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """
+    Return the process-wide LLMClient, created on first use. The persistent
+    response cache is opened here, and only if LLM_CACHE_ENABLED.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                cache = None
+                if LLM_CACHE_ENABLED:
+                    cache = DiskCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES)
+                _client = LLMClient(cache=cache)
+    return _client
@@ -0,0 +1,76 @@
+# core/pdf_extract.py
+# Kept free of heavy imports: process-pool workers import this module. Spawned
+# workers also re-run the parent's entry script's imports (as __mp_main__), so
+# when that is api.py or debug_app.py they still load its dependencies once
+# per worker.
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import fitz  # PyMuPDF
+
+from config import PDF_EXTRACT_WORKERS, PDF_PAGES_PER_TASK, PDF_PARALLEL_MIN_PAGES
+
+
+# ----------------------------------------------------
+# Worker side
+# ----------------------------------------------------
+_worker_doc = None
+
+
+def _init_pdf_worker(shm_name, size):
+    """Process-pool initializer: open the PDF from the parent's shared memory once per worker."""
+    global _worker_doc
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        _worker_doc = fitz.open(stream=bytes(shm.buf[:size]), filetype="pdf")
+    finally:
+        shm.close()
+
+
+def _extract_page_range(start, stop):
+    return [(n + 1, _worker_doc[n].get_text("text")) for n in range(start, stop)]
+
+
+# ----------------------------------------------------
+# Page iterator
+# ----------------------------------------------------
+def iter_pdf_pages(uploaded_file, workers=None, pages_per_task=None):
+    """
+    Yield (page_number, text) for each page of an uploaded PDF, in page order.
+    The PDF is opened from the in-memory upload bytes. Large documents are
+    split into page ranges that are extracted in a process pool; the bytes
+    go to the workers through one shared-memory block, and workers are
+    spawned rather than forked from this (multi-threaded) process.
+    """
+    data = uploaded_file.read()
+    workers = workers or PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+    pages_per_task = pages_per_task or PDF_PAGES_PER_TASK
+
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        page_count = doc.page_count
+        if workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+            for page_num, page in enumerate(doc, start=1):
+                yield page_num, page.get_text("text")
+            return
+
+    starts = range(0, page_count, pages_per_task)
+    stops = [min(start + pages_per_task, page_count) for start in starts]
+    size = len(data)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    shm.buf[:size] = data
+    del data
+    try:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(starts)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_pdf_worker,
+            initargs=(shm.name, size)
+        ) as pool:
+            # map() returns results in submission order, i.e. page order
+            for pages in pool.map(_extract_page_range, starts, stops):
+                yield from pages
+    finally:
+        shm.close()
+        shm.unlink()
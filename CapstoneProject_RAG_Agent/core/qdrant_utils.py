@@ -1,28 +1,92 @@
-from uuid import uuid4
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import PointStruct, VectorParams, Distance, Filter
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures, FIRST_COMPLETED, ALL_COMPLETED
+from uuid import uuid4, uuid5, NAMESPACE_URL
+from core.embeddings import embed_query, get_embeddings
+from core.answer_cache import answer_cache
+from core.sparse import document_sparse_vector, query_sparse_vector, has_identifier, lexical_coverage
+from core.vector_store import QdrantVectorStore, LocalVectorStore
+from config import (
+    VECTOR_BACKEND,
+    LOCAL_INDEX_PATH,
+    QDRANT_URL,
+    QDRANT_API_KEY,
+    QDRANT_COLLECTION,
+    VECTOR_QUANTIZATION,
+    QUANTIZATION_ALWAYS_RAM,
+    QUANTIZATION_RESCORE,
+    QUANTIZATION_OVERSAMPLING,
+    HNSW_M,
+    HNSW_EF_CONSTRUCT,
+    HNSW_EF,
+    VECTORS_ON_DISK,
+    QDRANT_UPSERT_BATCH_SIZE,
+    QDRANT_UPSERT_PARALLEL,
+    QDRANT_UPSERT_RETRIES,
+    HYBRID_SEARCH,
+    HYBRID_PREFETCH,
+    HYBRID_RRF_K,
+    HYBRID_IDENTIFIER_BONUS,
+)
+
+VECTOR_SIZE = 384
 
 # ---------------------------
-# Configuration
+# Vector store + collection setup
 # ---------------------------
-QDRANT_COLLECTION = "my_collection"
-QDRANT_URL = "http://localhost:6333"
+# Nothing connects at import time: the store is created (and the default
+# collection ensured) on first use.
+_store = None
+_store_lock = threading.Lock()
 
-# Embedding model
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+def create_vector_store(backend=None):
+    """Build the store selected by VECTOR_BACKEND ("qdrant" or "local")."""
+    backend = backend or VECTOR_BACKEND
+    if backend == "qdrant":
+        # QDRANT_URL may also be ":memory:" for an in-process instance
+        return QdrantVectorStore(
+            QDRANT_URL, QDRANT_API_KEY, vector_size=VECTOR_SIZE,
+            quantization=VECTOR_QUANTIZATION,
+            quantization_always_ram=QUANTIZATION_ALWAYS_RAM,
+            rescore=QUANTIZATION_RESCORE,
+            oversampling=QUANTIZATION_OVERSAMPLING,
+            hnsw_m=HNSW_M,
+            hnsw_ef_construct=HNSW_EF_CONSTRUCT,
+            hnsw_ef=HNSW_EF,
+            on_disk=VECTORS_ON_DISK
+        )
+    if backend == "local":
+        return LocalVectorStore(LOCAL_INDEX_PATH, vector_size=VECTOR_SIZE)
+    raise ValueError(f"Unknown VECTOR_BACKEND: {backend!r}")
 
-# Initialize Qdrant client
-client = QdrantClient(url=QDRANT_URL)
+def get_vector_store():
+    """Return the process-wide vector store, created on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = create_vector_store()
+                store.ensure_collection(QDRANT_COLLECTION, hybrid=HYBRID_SEARCH)
+                _store = store
+    return _store
 
-# Ensure collection exists
-collections = [c.name for c in client.get_collections().collections]
+def set_vector_store(store):
+    """Swap the vector store (e.g. a LocalVectorStore(None) in tests and benchmarks)."""
+    global _store
+    with _store_lock:
+        _store = store
 
-if QDRANT_COLLECTION not in collections:
-    client.recreate_collection(
-        collection_name=QDRANT_COLLECTION,
-        vectors_config=VectorParams(size=384, distance=Distance.COSINE)
-    )
+def ensure_collection(collection, hybrid=HYBRID_SEARCH):
+    """Create the collection if it does not exist (dense-only or dense + sparse)."""
+    get_vector_store().ensure_collection(collection, hybrid=hybrid)
+
+def collection_exists(collection):
+    return get_vector_store().collection_exists(collection)
+
+def is_hybrid(collection):
+    """True if the collection stores named dense + sparse vectors."""
+    return get_vector_store().is_hybrid(collection)
 
 # ---------------------------
 # Custom Document class
@@ -33,41 +97,221 @@ class CustomDocument:
         self.metadata = metadata
         self.id = str(uuid4())
 
+# ---------------------------
+# Point IDs
+# ---------------------------
+def make_point_id(source, text):
+    """
+    Deterministic point ID for a chunk: same source + same content -> same ID.
+    """
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return str(uuid5(NAMESPACE_URL, f"{source}:{digest}"))
+
+def make_point(collection, point_id, text, vector, payload):
+    """Build a store point, with a sparse vector when the collection is hybrid."""
+    return {
+        "id": point_id,
+        "vector": [float(x) for x in vector],
+        "sparse": document_sparse_vector(text) if is_hybrid(collection) else None,
+        "payload": {**payload, "text": text},
+    }
+
+def existing_point_ids(collection, ids):
+    """Return the subset of ids that are already stored in the collection."""
+    return get_vector_store().retrieve_ids(collection, ids)
+
+def source_point_ids(collection, source):
+    """Return the IDs of every point whose payload 'source' equals source."""
+    return get_vector_store().source_ids(collection, source)
+
+def delete_points(collection, ids):
+    if ids:
+        get_vector_store().delete(collection, ids)
+
+# ---------------------------
+# Bulk upsert
+# ---------------------------
+def _batched(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _upsert_batch(collection, batch, wait, retries):
+    """Upsert one batch, retrying with exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            get_vector_store().upsert(collection, batch, wait=wait)
+            return len(batch)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(0.5 * 2 ** attempt)
+
+def upsert_points(collection, points, batch_size=None, parallel=None, wait=True,
+                  retries=None, progress_callback=None, total=None):
+    """
+    Upserts an iterable of points (see make_point) in batches with a small pool of
+    concurrent in-flight requests. Points are consumed lazily, so at most
+    `parallel` batches are held in memory at once.
+
+    With wait=False batches are only acknowledged by the store; once every batch
+    is sent, the last batch is re-sent with wait=True as a barrier (IDs are
+    deterministic, so this is idempotent) and the call returns after all
+    updates are applied.
+
+    progress_callback(done, total) is invoked from the calling thread after
+    each batch completes. Returns the number of points written.
+    """
+    batch_size = batch_size or QDRANT_UPSERT_BATCH_SIZE
+    parallel = parallel or QDRANT_UPSERT_PARALLEL
+    retries = QDRANT_UPSERT_RETRIES if retries is None else retries
+
+    done, last_batch = 0, None
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        def drain(return_when):
+            nonlocal done, in_flight
+            finished, in_flight = wait_futures(in_flight, return_when=return_when)
+            for future in finished:
+                done += future.result()
+                if progress_callback:
+                    progress_callback(done, total)
+
+        for batch in _batched(points, batch_size):
+            if len(in_flight) >= parallel:
+                drain(FIRST_COMPLETED)
+            in_flight.add(pool.submit(_upsert_batch, collection, batch, wait, retries))
+            last_batch = batch
+        if in_flight:
+            drain(ALL_COMPLETED)
+
+    if not wait and last_batch:
+        _upsert_batch(collection, last_batch, True, retries)
+    return done
+
 # ---------------------------
 # Upsert function
 # ---------------------------
-def upsert_to_qdrant(collection, texts, metadatas, embeddings):
+def upsert_to_qdrant(collection, texts, metadatas, embeddings=None, prune=True,
+                     batch_size=None, parallel=None, wait=True, progress_callback=None):
     """
-    Upserts documents into Qdrant.
+    Incrementally upserts documents into the vector store.
+
+    Each chunk gets a content-addressed ID, so chunks that are already stored
+    are skipped and only new or changed chunks are embedded and written.
+    Embeddings may be passed in (aligned with texts); otherwise they are
+    computed here, one batch at a time, for the new chunks only. With
+    prune=True, points of a re-ingested source that are no longer among its
+    chunks are deleted. Batching options are passed to upsert_points.
+
+    Returns {"added": int, "skipped": int, "deleted": int}.
     """
-    points = [
-        PointStruct(
-            id=str(uuid4()),
-            vector=embeddings[i],
-            payload={**metadatas[i], "text": texts[i]}
+    batch_size = batch_size or QDRANT_UPSERT_BATCH_SIZE
+
+    # Deduplicate within the call, keeping the first occurrence
+    chunks = {}
+    for i, text in enumerate(texts):
+        point_id = make_point_id(metadatas[i].get("source", "unknown"), text)
+        chunks.setdefault(point_id, i)
+
+    existing = existing_point_ids(collection, chunks)
+    new_ids = [pid for pid in chunks if pid not in existing]
+
+    def build_points():
+        for id_batch in _batched(new_ids, batch_size):
+            if embeddings is None:
+                vectors = get_embeddings([texts[chunks[pid]] for pid in id_batch])
+            else:
+                vectors = [embeddings[chunks[pid]] for pid in id_batch]
+            for n, pid in enumerate(id_batch):
+                yield make_point(
+                    collection, pid, texts[chunks[pid]], vectors[n], metadatas[chunks[pid]]
+                )
+
+    if new_ids:
+        upsert_points(
+            collection, build_points(),
+            batch_size=batch_size, parallel=parallel, wait=wait,
+            progress_callback=progress_callback, total=len(new_ids)
         )
-        for i in range(len(texts))
-    ]
-    client.upsert(
-        collection_name=collection,
-        points=points
-    )
+
+    deleted = set()
+    if prune:
+        for source in {m.get("source", "unknown") for m in metadatas}:
+            deleted |= source_point_ids(collection, source) - set(chunks)
+        delete_points(collection, deleted)
+
+    if new_ids or deleted:
+        # Cached answers may no longer reflect the collection
+        answer_cache.invalidate(collection)
+
+    return {"added": len(new_ids), "skipped": len(texts) - len(new_ids), "deleted": len(deleted)}
 
 # ---------------------------
 # Query function
 # ---------------------------
-def qdrant_query(query, topk=5, collection="my_collection"):
-    query_vector = embedding_model.embed_query(query)
-    response = client.query_points(
-        collection_name=collection,
-        query=query_vector,
-        limit=topk
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = (sum(x * x for x in a) * sum(y * y for y in b)) ** 0.5
+    return dot / norm if norm else 0.0
+
+def rrf_scores(rankings, k=HYBRID_RRF_K):
+    """Reciprocal-rank fusion: {key: score} over lists of keys, each best first."""
+    scores = {}
+    for ranked in rankings:
+        for rank, key in enumerate(ranked):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return scores
+
+def qdrant_query(query, topk=5, collection=QDRANT_COLLECTION):
+    """
+    Return the top-k hits as [{"payload", "score", "vector"}], where
+    "vector" is the stored dense vector (used for context diversity).
+
+    On hybrid collections the dense and sparse searches run in one batched
+    request and reciprocal-rank fusion picks and orders the top-k hits; the
+    fused score is kept as "rrf_score" and is what the context packer ranks
+    by. "score" is the confidence the thresholds compare against: the dense
+    cosine ("dense_score"), plus HYBRID_IDENTIFIER_BONUS for the top sparse
+    hit when the query names an identifier and that hit contains every
+    query term.
+    """
+    store = get_vector_store()
+    query_vector = embed_query(query)
+    if not store.is_hybrid(collection):
+        (hits,) = store.query(collection, query_vector, limit=topk, with_vectors=True)
+        return [{"payload": hit["payload"], "score": hit["score"], "vector": hit["vector"]} for hit in hits]
+
+    indices, values = query_sparse_vector(query)
+    results = store.query(
+        collection, query_vector, sparse=(indices, values) if indices else None,
+        limit=HYBRID_PREFETCH, with_vectors=True
     )
-    
+
+    by_id = {hit["id"]: hit for ranked in results for hit in ranked}
+    fused = rrf_scores([[hit["id"] for hit in ranked] for ranked in results])
+
+    exact_id = None
+    if len(results) > 1 and results[1] and has_identifier(query):
+        top_sparse = results[1][0]
+        if lexical_coverage(query, top_sparse["payload"].get("text", "")) == 1.0:
+            exact_id = top_sparse["id"]
+
     hits = []
-    for hit in response.points:  # <-- use .points
+    for point_id in sorted(fused, key=fused.get, reverse=True)[:topk]:
+        hit = by_id[point_id]
+        dense_score = _cosine(query_vector, hit["vector"])
+        bonus = HYBRID_IDENTIFIER_BONUS if point_id == exact_id else 0.0
         hits.append({
-            "payload": hit.payload,
-            "score": hit.score or 0.0
+            "payload": hit["payload"],
+            "score": min(1.0, dense_score + bonus),
+            "dense_score": dense_score,
+            "rrf_score": fused[point_id],
+            "vector": hit["vector"]
         })
-    return hits
\ No newline at end of file
+    return hits
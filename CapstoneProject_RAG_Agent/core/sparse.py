@@ -0,0 +1,70 @@
+# core/sparse.py
+import re
+import zlib
+from collections import Counter
+
+# ----------------------------------------------------
+# Lexical (sparse) vectors for hybrid retrieval
+# ----------------------------------------------------
+# Documents get BM25-style saturated term frequencies; Qdrant applies the
+# IDF part through the sparse vector's IDF modifier, so the collection
+# statistics stay up to date as documents are added.
+BM25_K1 = 1.2
+BM25_B = 0.75
+BM25_AVG_DOC_LEN = 150  # tokens; roughly a 1,000-character chunk
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further
+had has have having he her here hers him his how i if in into is it its itself just me more
+most my no nor not of off on once only or other our out over own same she should so some
+such than that the their them then there these they this those through to too under until
+up very was we were what when where which while who whom why will with would you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens; identifiers like 'XR-200' or 'v1.2.3' stay whole."""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def _index(token):
+    return zlib.crc32(token.encode("utf-8")) & 0x7FFFFFFF
+
+
+def _to_sparse(weights):
+    # Hash collisions are merged by summing
+    merged = {}
+    for token, weight in weights.items():
+        idx = _index(token)
+        merged[idx] = merged.get(idx, 0.0) + weight
+    indices = sorted(merged)
+    return indices, [merged[i] for i in indices]
+
+
+def document_sparse_vector(text):
+    """(indices, values) with BM25 term-frequency saturation for a stored chunk."""
+    tokens = tokenize(text)
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / BM25_AVG_DOC_LEN)
+    weights = {t: tf * (BM25_K1 + 1) / (tf + norm) for t, tf in Counter(tokens).items()}
+    return _to_sparse(weights)
+
+
+def query_sparse_vector(text):
+    """(indices, values) for a query: each distinct term weighted 1."""
+    return _to_sparse({t: 1.0 for t in set(tokenize(text))})
+
+
+def has_identifier(text):
+    """True if text names an identifier-like term ('XR-200', 'v1.2.3', 'e42')."""
+    return any(any(c.isdigit() or c in "-_./" for c in t) for t in tokenize(text))
+
+
+def lexical_coverage(query, text):
+    """Fraction of the query's content terms that occur in text (0-1)."""
+    query_terms = set(tokenize(query))
+    if not query_terms:
+        return 0.0
+    return len(query_terms & set(tokenize(text))) / len(query_terms)
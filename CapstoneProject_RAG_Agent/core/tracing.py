@@ -0,0 +1,185 @@
+# core/tracing.py
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import METRICS_HOST, METRICS_PORT
+from core.context_packer import estimate_tokens
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+
+
+# ----------------------------------------------------
+# Prometheus-style metrics (text exposition format)
+# ----------------------------------------------------
+def _label_str(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_label_str(self.labels, key, ('le', bound))} {count}")
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, key, ('le', '+Inf'))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_str(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def expose(self):
+        return "\n".join(line for metric in self._metrics for line in metric.expose()) + "\n"
+
+
+registry = MetricsRegistry()
+QUERIES = registry.counter("rag_queries_total", "Queries answered, by confidence branch.", ["branch"])
+QUERY_SECONDS = registry.histogram("rag_query_duration_seconds", "End-to-end query wall time.", ["branch"])
+STAGE_SECONDS = registry.histogram("rag_stage_duration_seconds", "Wall time per pipeline stage.", ["stage"])
+STAGE_ERRORS = registry.counter("rag_stage_errors_total", "Pipeline stages that raised.", ["stage"])
+LLM_TOKENS = registry.counter("rag_llm_tokens_total", "Estimated LLM tokens, by stage.", ["stage", "kind"])
+HITS = registry.histogram("rag_retrieved_hits", "Chunks placed in the context per retrieval.", ["stage"],
+                          buckets=(0, 1, 2, 3, 5, 10, 20))
+
+
+# ----------------------------------------------------
+# Per-query trace
+# ----------------------------------------------------
+class Trace:
+    """
+    Spans for one query. Each span is a dict with "stage", "start_ms",
+    "duration_ms" and whatever attributes the stage sets on it (hits,
+    prompt_tokens, completion_tokens, ...); spans also feed the metrics.
+    """
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self.spans = []
+        self.branch = None
+        self.total_ms = None
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        span = {"stage": stage, "start_ms": round((time.perf_counter() - self._started) * 1000, 3), **attrs}
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span["error"] = f"{type(e).__name__}: {e}"
+            STAGE_ERRORS.inc(stage=stage)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            span["duration_ms"] = round(elapsed * 1000, 3)
+            self.spans.append(span)
+            STAGE_SECONDS.observe(elapsed, stage=stage)
+            if "hits" in span:
+                HITS.observe(span["hits"], stage=stage)
+            for kind in ("prompt", "completion"):
+                if f"{kind}_tokens" in span:
+                    LLM_TOKENS.inc(span[f"{kind}_tokens"], stage=stage, kind=kind)
+
+    def finish(self, branch):
+        """Close the trace under a branch name and return it as a dict."""
+        self.branch = branch
+        self.total_ms = round((time.perf_counter() - self._started) * 1000, 3)
+        QUERIES.inc(branch=branch)
+        QUERY_SECONDS.observe(self.total_ms / 1000, branch=branch)
+        return self.to_dict()
+
+    def to_dict(self):
+        return {"branch": self.branch, "total_ms": self.total_ms, "spans": list(self.spans)}
+
+
+def add_llm_tokens(span, prompt_parts, completion):
+    """Record estimated prompt / completion token counts of an LLM stage on its span."""
+    span["prompt_tokens"] = sum(estimate_tokens(p or "") for p in prompt_parts)
+    span["completion_tokens"] = estimate_tokens(completion or "")
+
+
+# ----------------------------------------------------
+# Local /metrics endpoint
+# ----------------------------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.expose().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Serve /metrics from a daemon thread; repeated calls reuse the running server."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
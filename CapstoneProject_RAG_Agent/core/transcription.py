@@ -0,0 +1,150 @@
+# core/transcription.py
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import (
+    WHISPER_MODEL_NAME,
+    AUDIO_TRANSCRIBE_WORKERS,
+    AUDIO_SEGMENT_SECONDS,
+    AUDIO_MIN_SEGMENT_SECONDS,
+    AUDIO_MAX_SEGMENT_SECONDS,
+    AUDIO_SILENCE_THRESHOLD,
+)
+
+SAMPLE_RATE = 16000  # whisper.load_audio resamples to 16 kHz mono
+FRAME_SECONDS = 0.03
+
+# ----------------------------------------------------
+# Whisper models (shared one loaded on first use)
+# ----------------------------------------------------
+_whisper_model = None
+_whisper_lock = threading.Lock()
+
+
+def get_whisper_model():
+    """Return the shared Whisper model, loading it on first use."""
+    global _whisper_model
+    if _whisper_model is None:
+        with _whisper_lock:
+            if _whisper_model is None:
+                import whisper
+                _whisper_model = whisper.load_model(WHISPER_MODEL_NAME)
+    return _whisper_model
+
+
+class _ModelPool:
+    """
+    Hands out one Whisper model per concurrent worker. Whisper installs
+    decoding hooks on the model, so a model is never used by two threads at
+    once. The first slot reuses the shared model; extra ones load on demand.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._created = 0
+        self._free = queue.Queue()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                if self._created == 1:
+                    return get_whisper_model()
+                import whisper
+                return whisper.load_model(WHISPER_MODEL_NAME)
+        return self._free.get()
+
+    def release(self, model):
+        self._free.put(model)
+
+
+_model_pool = _ModelPool(AUDIO_TRANSCRIBE_WORKERS)
+
+
+# ----------------------------------------------------
+# Silence-based segmentation
+# ----------------------------------------------------
+def split_on_silence(audio, sample_rate=SAMPLE_RATE, target_seconds=None, min_seconds=None,
+                     max_seconds=None, threshold=None):
+    """
+    Split a mono float waveform into (start_sample, end_sample) segments.
+    Each cut is placed on the quiet frame (RMS below threshold) closest to
+    target_seconds into the segment, keeping segments between min_seconds
+    and max_seconds; without a quiet frame the segment is cut at max_seconds.
+    """
+    target_seconds = target_seconds or AUDIO_SEGMENT_SECONDS
+    min_seconds = min_seconds or AUDIO_MIN_SEGMENT_SECONDS
+    max_seconds = max_seconds or AUDIO_MAX_SEGMENT_SECONDS
+    threshold = AUDIO_SILENCE_THRESHOLD if threshold is None else threshold
+
+    frame = int(sample_rate * FRAME_SECONDS)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    frames = np.asarray(audio[: n_frames * frame], dtype=np.float32).reshape(n_frames, frame)
+    silent = np.flatnonzero(np.sqrt(np.mean(frames ** 2, axis=1)) < threshold)
+
+    target_f = int(target_seconds / FRAME_SECONDS)
+    min_f = int(min_seconds / FRAME_SECONDS)
+    max_f = int(max_seconds / FRAME_SECONDS)
+
+    segments, start_f = [], 0
+    while n_frames - start_f > max_f:
+        lo = np.searchsorted(silent, start_f + min_f)
+        hi = np.searchsorted(silent, start_f + max_f, side="right")
+        candidates = silent[lo:hi]
+        if len(candidates):
+            cut_f = int(candidates[np.argmin(np.abs(candidates - (start_f + target_f)))])
+        else:
+            cut_f = start_f + max_f
+        segments.append((start_f * frame, cut_f * frame))
+        start_f = cut_f
+    segments.append((start_f * frame, len(audio)))
+    return segments
+
+
+# ----------------------------------------------------
+# Segmented transcription
+# ----------------------------------------------------
+def _transcribe_segment(audio):
+    model = _model_pool.acquire()
+    try:
+        return model.transcribe(audio)["text"].strip()
+    finally:
+        _model_pool.release(model)
+
+
+def iter_transcript_segments(audio_path, workers=None):
+    """
+    Transcribe an audio file segment by segment.
+    Segments are cut at silence, transcribed across a worker pool and yielded
+    in order as {"text", "start", "end"} (seconds), so earlier segments can be
+    ingested while later ones are still being transcribed.
+    """
+    import whisper
+
+    audio = whisper.load_audio(audio_path)
+    segments = split_on_silence(audio)
+    workers = workers or AUDIO_TRANSCRIBE_WORKERS
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_transcribe_segment, audio[start:end]) for start, end in segments]
+        try:
+            for (start, end), future in zip(segments, futures):
+                yield {
+                    "text": future.result(),
+                    "start": round(start / SAMPLE_RATE, 2),
+                    "end": round(end / SAMPLE_RATE, 2),
+                }
+        finally:
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,507 @@
+# core/vector_store.py
+import json
+import math
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+DENSE_VECTOR = "dense"
+SPARSE_VECTOR = "sparse"
+
+
+# ----------------------------------------------------
+# Interface
+# ----------------------------------------------------
+class VectorStore(ABC):
+    """
+    Storage backend behind core.qdrant_utils.
+
+    Points are plain dicts: {"id": str, "vector": list[float],
+    "sparse": (indices, values) or None, "payload": dict}.
+    Hits are dicts: {"id", "payload", "score", "vector"} where "vector" is the
+    dense vector when requested, else None.
+    """
+
+    @abstractmethod
+    def ensure_collection(self, collection, hybrid=False):
+        raise NotImplementedError
+
+    @abstractmethod
+    def collection_exists(self, collection):
+        raise NotImplementedError
+
+    @abstractmethod
+    def is_hybrid(self, collection):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert(self, collection, points, wait=True):
+        raise NotImplementedError
+
+    @abstractmethod
+    def retrieve_ids(self, collection, ids):
+        """Return the subset of ids present in the collection."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def source_ids(self, collection, source):
+        """Return the ids of all points whose payload 'source' equals source."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, collection, ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def query(self, collection, dense, sparse=None, limit=10, with_vectors=False):
+        """
+        Run the dense search and, if `sparse` is given on a hybrid collection,
+        the sparse search. Returns one list of hits per search, best first.
+        """
+        raise NotImplementedError
+
+
+# ----------------------------------------------------
+# Qdrant server (or qdrant_client's in-process mode)
+# ----------------------------------------------------
+class QdrantVectorStore(VectorStore):
+    ID_BATCH = 1000
+
+    def __init__(self, location, api_key=None, vector_size=384, quantization=None,
+                 quantization_always_ram=True, rescore=True, oversampling=None,
+                 hnsw_m=None, hnsw_ef_construct=None, hnsw_ef=None, on_disk=False):
+        """
+        Index options (None = Qdrant default) are applied when a collection is
+        created; hnsw_ef, rescore and oversampling are sent with every search.
+        quantization is None, "scalar" (int8) or "binary".
+        """
+        from qdrant_client import QdrantClient
+        from qdrant_client.http import models
+
+        self.models = models
+        self.client = QdrantClient(location=location, api_key=api_key)
+        self.vector_size = vector_size
+        self.on_disk = on_disk
+        self._hybrid = {}
+
+        if quantization == "scalar":
+            self.quantization_config = models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8, quantile=0.99, always_ram=quantization_always_ram
+                )
+            )
+        elif quantization == "binary":
+            self.quantization_config = models.BinaryQuantization(
+                binary=models.BinaryQuantizationConfig(always_ram=quantization_always_ram)
+            )
+        elif quantization is None:
+            self.quantization_config = None
+        else:
+            raise ValueError(f"Unknown quantization: {quantization!r}")
+
+        self.hnsw_config = None
+        if hnsw_m is not None or hnsw_ef_construct is not None:
+            self.hnsw_config = models.HnswConfigDiff(m=hnsw_m, ef_construct=hnsw_ef_construct)
+
+        self.search_params = None
+        if hnsw_ef is not None or quantization is not None:
+            self.search_params = models.SearchParams(
+                hnsw_ef=hnsw_ef,
+                quantization=models.QuantizationSearchParams(
+                    rescore=rescore, oversampling=oversampling
+                ) if quantization is not None else None
+            )
+
+    def ensure_collection(self, collection, hybrid=False):
+        m = self.models
+        if self.client.collection_exists(collection):
+            return
+        dense = m.VectorParams(size=self.vector_size, distance=m.Distance.COSINE, on_disk=self.on_disk or None)
+        index_options = {"hnsw_config": self.hnsw_config, "quantization_config": self.quantization_config}
+        if hybrid:
+            self.client.create_collection(
+                collection_name=collection,
+                vectors_config={DENSE_VECTOR: dense},
+                sparse_vectors_config={SPARSE_VECTOR: m.SparseVectorParams(modifier=m.Modifier.IDF)},
+                **index_options
+            )
+        else:
+            self.client.create_collection(
+                collection_name=collection,
+                vectors_config=dense,
+                **index_options
+            )
+
+    def collection_exists(self, collection):
+        return self.client.collection_exists(collection)
+
+    def is_hybrid(self, collection):
+        if collection not in self._hybrid:
+            params = self.client.get_collection(collection).config.params
+            self._hybrid[collection] = bool(params.sparse_vectors)
+        return self._hybrid[collection]
+
+    def _to_point_struct(self, collection, point):
+        m = self.models
+        vector = point["vector"]
+        if self.is_hybrid(collection):
+            indices, values = point.get("sparse") or ([], [])
+            vector = {
+                DENSE_VECTOR: vector,
+                SPARSE_VECTOR: m.SparseVector(indices=indices, values=values)
+            }
+        return m.PointStruct(id=point["id"], vector=vector, payload=point["payload"])
+
+    def upsert(self, collection, points, wait=True):
+        self.client.upsert(
+            collection_name=collection,
+            points=[self._to_point_struct(collection, p) for p in points],
+            wait=wait
+        )
+
+    def retrieve_ids(self, collection, ids):
+        ids = list(ids)
+        found = set()
+        for start in range(0, len(ids), self.ID_BATCH):
+            records = self.client.retrieve(
+                collection_name=collection,
+                ids=ids[start:start + self.ID_BATCH],
+                with_payload=False,
+                with_vectors=False
+            )
+            found.update(str(r.id) for r in records)
+        return found
+
+    def source_ids(self, collection, source):
+        m = self.models
+        source_filter = m.Filter(must=[m.FieldCondition(key="source", match=m.MatchValue(value=source))])
+        ids, offset = set(), None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=collection,
+                scroll_filter=source_filter,
+                limit=self.ID_BATCH,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            ids.update(str(r.id) for r in records)
+            if offset is None:
+                return ids
+
+    def delete(self, collection, ids):
+        if ids:
+            self.client.delete(
+                collection_name=collection,
+                points_selector=self.models.PointIdsList(points=list(ids))
+            )
+
+    def _hit(self, point, hybrid):
+        vector = point.vector
+        if hybrid and isinstance(vector, dict):
+            vector = vector.get(DENSE_VECTOR)
+        return {"id": str(point.id), "payload": point.payload, "score": point.score or 0.0, "vector": vector}
+
+    def query(self, collection, dense, sparse=None, limit=10, with_vectors=False):
+        m = self.models
+        if not self.is_hybrid(collection):
+            response = self.client.query_points(
+                collection_name=collection,
+                query=dense,
+                limit=limit,
+                with_payload=True,
+                with_vectors=with_vectors,
+                search_params=self.search_params
+            )
+            return [[self._hit(p, False) for p in response.points]]
+
+        vectors = [DENSE_VECTOR] if with_vectors else False
+        requests = [
+            m.QueryRequest(query=dense, using=DENSE_VECTOR, limit=limit,
+                           with_payload=True, with_vector=vectors, params=self.search_params)
+        ]
+        if sparse and sparse[0]:
+            indices, values = sparse
+            requests.append(
+                m.QueryRequest(query=m.SparseVector(indices=indices, values=values), using=SPARSE_VECTOR,
+                               limit=limit, with_payload=True, with_vector=vectors)
+            )
+        responses = self.client.query_batch_points(collection_name=collection, requests=requests)
+        return [[self._hit(p, True) for p in response.points] for response in responses]
+
+
+# ----------------------------------------------------
+# Embedded local index (NumPy matrix, memory-mapped)
+# ----------------------------------------------------
+class _LocalCollection:
+    """
+    One collection of the local index.
+    Dense vectors are L2-normalised rows of a float32 matrix (memory-mapped
+    from <dir>/vectors.f32 when persistent); ids, payloads and sparse vectors
+    live in <dir>/points.sqlite. Deleted rows are recycled.
+    """
+
+    def __init__(self, directory, dim, hybrid):
+        self.dim = dim
+        self.hybrid = hybrid
+        self.directory = directory
+        self.lock = threading.RLock()
+
+        db_path = ":memory:"
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            db_path = os.path.join(directory, "points.sqlite")
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS points ("
+            " id TEXT PRIMARY KEY, row INTEGER NOT NULL, source TEXT, payload TEXT, sparse TEXT)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS points_source ON points (source)")
+        stored = dict(self.db.execute("SELECT key, value FROM meta").fetchall())
+        if stored:
+            self.dim = int(stored["dim"])
+            self.hybrid = stored["hybrid"] == "1"
+        else:
+            self.db.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)",
+                [("dim", str(self.dim)), ("hybrid", "1" if self.hybrid else "0")]
+            )
+        self.db.commit()
+
+        rows = self.db.execute("SELECT id, row, sparse FROM points").fetchall()
+        capacity = max(1024, 2 ** math.ceil(math.log2(max(len(rows), 1) + 1)))
+        self.matrix = self._open_matrix(capacity)
+        self.row_ids = {}
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.free_rows = []
+        self.postings = {}  # sparse term -> {row: weight}
+        self.sparse_by_row = {}
+        for point_id, row, sparse in rows:
+            self._ensure_capacity(row + 1)
+            self.row_ids[row] = point_id
+            self.alive[row] = True
+            if sparse:
+                self._index_sparse(row, json.loads(sparse))
+        self.next_row = max(self.row_ids, default=-1) + 1
+        self.free_rows = [r for r in range(self.next_row) if not self.alive[r]]
+
+    # storage -------------------------------------------------------------
+    def _open_matrix(self, capacity):
+        if not self.directory:
+            return np.zeros((capacity, self.dim), dtype=np.float32)
+        path = os.path.join(self.directory, "vectors.f32")
+        size = capacity * self.dim * 4
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        with open(path, mode) as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, rows_needed):
+        capacity = self.matrix.shape[0]
+        if rows_needed <= capacity:
+            return
+        new_capacity = max(rows_needed, capacity * 2)
+        if self.directory:
+            self.matrix.flush()
+            del self.matrix
+            self.matrix = self._open_matrix(new_capacity)
+        else:
+            grown = np.zeros((new_capacity, self.dim), dtype=np.float32)
+            grown[:capacity] = self.matrix
+            self.matrix = grown
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:capacity] = self.alive
+        self.alive = alive
+
+    def _index_sparse(self, row, sparse):
+        indices, values = sparse
+        self.sparse_by_row[row] = indices
+        for idx, value in zip(indices, values):
+            self.postings.setdefault(idx, {})[row] = value
+
+    def _unindex_sparse(self, row):
+        for idx in self.sparse_by_row.pop(row, []):
+            posting = self.postings.get(idx)
+            if posting is not None:
+                posting.pop(row, None)
+                if not posting:
+                    del self.postings[idx]
+
+    # writes ----------------------------------------------------------------
+    def upsert(self, points):
+        with self.lock:
+            for point in points:
+                vector = np.asarray(point["vector"], dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                vector = vector / norm if norm else vector
+
+                existing = self.db.execute("SELECT row FROM points WHERE id = ?", (point["id"],)).fetchone()
+                if existing is not None:
+                    row = existing[0]
+                    self._unindex_sparse(row)
+                elif self.free_rows:
+                    row = self.free_rows.pop()
+                else:
+                    row = self.next_row
+                    self.next_row += 1
+                    self._ensure_capacity(self.next_row)
+
+                self.matrix[row] = vector
+                self.alive[row] = True
+                self.row_ids[row] = point["id"]
+                sparse = point.get("sparse") if self.hybrid else None
+                if sparse:
+                    self._index_sparse(row, sparse)
+                self.db.execute(
+                    "INSERT OR REPLACE INTO points (id, row, source, payload, sparse) VALUES (?, ?, ?, ?, ?)",
+                    (point["id"], row, point["payload"].get("source"), json.dumps(point["payload"]),
+                     json.dumps(sparse) if sparse else None)
+                )
+            if isinstance(self.matrix, np.memmap):
+                self.matrix.flush()
+            self.db.commit()
+
+    def delete(self, ids):
+        with self.lock:
+            for point_id in ids:
+                found = self.db.execute("SELECT row FROM points WHERE id = ?", (point_id,)).fetchone()
+                if found is None:
+                    continue
+                row = found[0]
+                self.alive[row] = False
+                self.row_ids.pop(row, None)
+                self._unindex_sparse(row)
+                self.free_rows.append(row)
+                self.db.execute("DELETE FROM points WHERE id = ?", (point_id,))
+            self.db.commit()
+
+    # reads -----------------------------------------------------------------
+    def retrieve_ids(self, ids):
+        ids = list(ids)
+        found = set()
+        with self.lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                marks = ",".join("?" * len(batch))
+                found.update(r[0] for r in self.db.execute(f"SELECT id FROM points WHERE id IN ({marks})", batch))
+        return found
+
+    def source_ids(self, source):
+        with self.lock:
+            return {r[0] for r in self.db.execute("SELECT id FROM points WHERE source = ?", (source,))}
+
+    def _hits(self, rows, scores, with_vectors):
+        if not len(rows):
+            return []
+        rows = [int(r) for r in rows]
+        ids = [self.row_ids[r] for r in rows]
+        marks = ",".join("?" * len(ids))
+        payloads = dict(self.db.execute(f"SELECT id, payload FROM points WHERE id IN ({marks})", ids).fetchall())
+        return [
+            {
+                "id": point_id,
+                "payload": json.loads(payloads[point_id]),
+                "score": float(score),
+                "vector": self.matrix[row].tolist() if with_vectors else None,
+            }
+            for row, point_id, score in zip(rows, ids, scores)
+        ]
+
+    def dense_search(self, dense, limit, with_vectors):
+        with self.lock:
+            n = self.next_row
+            if n == 0:
+                return []
+            q = np.asarray(dense, dtype=np.float32)
+            norm = np.linalg.norm(q)
+            q = q / norm if norm else q
+            scores = self.matrix[:n] @ q
+            scores[~self.alive[:n]] = -np.inf
+            k = min(limit, int(self.alive[:n].sum()))
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return self._hits(top, scores[top], with_vectors)
+
+    def sparse_search(self, sparse, limit, with_vectors):
+        indices, values = sparse
+        with self.lock:
+            n_docs = len(self.row_ids)
+            totals = {}
+            for idx, q_weight in zip(indices, values):
+                posting = self.postings.get(idx)
+                if not posting:
+                    continue
+                df = len(posting)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for row, weight in posting.items():
+                    totals[row] = totals.get(row, 0.0) + q_weight * weight * idf
+            best = sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+            return self._hits([r for r, _ in best], [s for _, s in best], with_vectors)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector index: brute-force cosine search over a memory-mapped
+    NumPy matrix, plus an in-memory inverted index for sparse vectors.
+    path=None keeps everything in RAM (useful for tests).
+    """
+
+    def __init__(self, path=None, vector_size=384):
+        self.path = path
+        self.vector_size = vector_size
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def _directory(self, collection):
+        return os.path.join(self.path, collection) if self.path else None
+
+    def _get(self, collection, hybrid=None):
+        with self._lock:
+            if collection not in self._collections:
+                directory = self._directory(collection)
+                exists = directory and os.path.exists(os.path.join(directory, "points.sqlite"))
+                if hybrid is None and not exists:
+                    raise KeyError(f"Collection {collection!r} does not exist")
+                self._collections[collection] = _LocalCollection(directory, self.vector_size, bool(hybrid))
+            return self._collections[collection]
+
+    def ensure_collection(self, collection, hybrid=False):
+        self._get(collection, hybrid)
+
+    def collection_exists(self, collection):
+        directory = self._directory(collection)
+        with self._lock:
+            return collection in self._collections or bool(
+                directory and os.path.exists(os.path.join(directory, "points.sqlite"))
+            )
+
+    def is_hybrid(self, collection):
+        return self._get(collection).hybrid
+
+    def upsert(self, collection, points, wait=True):
+        self._get(collection).upsert(points)
+
+    def retrieve_ids(self, collection, ids):
+        return self._get(collection).retrieve_ids(ids)
+
+    def source_ids(self, collection, source):
+        return self._get(collection).source_ids(source)
+
+    def delete(self, collection, ids):
+        if ids:
+            self._get(collection).delete(ids)
+
+    def query(self, collection, dense, sparse=None, limit=10, with_vectors=False):
+        store = self._get(collection)
+        results = [store.dense_search(dense, limit, with_vectors)]
+        if store.hybrid and sparse and sparse[0]:
+            results.append(store.sparse_search(sparse, limit, with_vectors))
+        return results
@@ -8,7 +8,7 @@ from agents.extractor_agent import (
     upsert_to_qdrant_tool
 )
 
-from core.embeddings import semantic_chunk_text, get_embeddings
+from core.embeddings import semantic_chunk_text
 from core.crew_pipeline import RAGQueryTask
 from core.crew_rag_pipeline_conditional import ConditionalRAGCrew
 from config import QDRANT_COLLECTION
@@ -84,31 +84,34 @@ def main():
         sys.exit(1)
 
     # -------------------------
-    # 3. Chunk & Embed
+    # 3. Chunk
     # -------------------------
-    separator("CHUNKING & EMBEDDING")
+    separator("CHUNKING")
 
     chunks = semantic_chunk_text(text_content)
     print(f"\nTotal chunks: {len(chunks)}")
 
-    embeddings = get_embeddings(chunks)
-    print("Embeddings generated.")
-
     metadata = [{"source": os.path.basename(file_path)} for _ in chunks]
 
     # -------------------------
-    # 4. Qdrant Upsert
+    # 4. Embed & Qdrant Upsert (new or changed chunks only)
     # -------------------------
-    separator("UPSERT TO LOCAL QDRANT")
+    separator("EMBED & UPSERT TO LOCAL QDRANT")
 
     try:
-        upsert_to_qdrant_tool.run(
+        counts = upsert_to_qdrant_tool.run(
             QDRANT_COLLECTION,
             chunks,
             metadata,
-            embeddings
+            progress_callback=lambda done, total: print(
+                f"\r  upserted {done}/{total} chunks", end="", flush=True
+            )
+        )
+        print()
+        print(
+            f"Successfully stored in Qdrant: {counts['added']} added, "
+            f"{counts['skipped']} skipped, {counts['deleted']} deleted."
         )
-        print("Successfully stored in Qdrant.")
 
     except Exception as e:
         print("Failed to upsert into Qdrant:")
@@ -155,12 +158,21 @@ def main():
 
         try:
             #result = task.run(query, QDRANT_COLLECTION)
-            result = crew.kickoff(query)
+            print("\nDRAFT (streaming):")
+            result = crew.kickoff(
+                query,
+                on_token=lambda token: print(token, end="", flush=True)
+            )
+            print()
             print("\nANSWER:")
             print(result["answer"])
 
             print("\nSources:", ", ".join(result["sources"]))
             print("Confidence:", result["confidence"])
+            stats = result.get("context_stats")
+            if stats:
+                print(f"Context: {stats['selected']}/{stats['candidates']} chunks, "
+                      f"~{stats['tokens_packed']} tokens ({stats['tokens_saved']} saved)")
 
         except Exception as e:
             print("Error while answering:")
@@ -0,0 +1,360 @@
+# tools/benchmark.py
+"""
+Offline benchmark: ingestion throughput and per-stage query latency.
+
+Everything runs locally: a stand-in LM Studio server returning canned
+completions, an in-memory vector store and a stubbed web search, so runs
+are comparable across commits:
+
+    python tools/benchmark.py --json bench.json
+    python tools/benchmark.py --corpus ./data/sample_docs --queries ./data/sample_queries.txt --llm-latency 50
+
+Without --corpus a synthetic corpus is generated; without --queries,
+queries are drawn from the corpus plus off-topic questions (which take the
+low-confidence branches). The embedding model must already be cached.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+BENCH_COLLECTION = "benchmark"
+
+
+# ---------------------------
+# Stand-in LLM server
+# ---------------------------
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible /chat/completions returning canned completions."""
+    protocol_version = "HTTP/1.1"
+    latency = 0.0  # seconds per completion
+    insufficient_rate = 0.5  # share of improve prompts answered with INSUFFICIENT
+
+    def log_message(self, *args):
+        pass
+
+    def completion(self, prompt):
+        if "Rate the following answer" in prompt:
+            return "0.7"
+        if "INSUFFICIENT" in prompt:
+            bucket = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16) % 1000
+            if bucket < self.insufficient_rate * 1000:
+                return "INSUFFICIENT"
+            return "Improved answer based on the documents provided."
+        # Draft: echo the opening of the context, so the answer is grounded in it
+        context = prompt.split("Use the context to answer:", 1)[-1].split("Question:", 1)[0]
+        return context.strip()[:300] or "I could not find this in the documents."
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        time.sleep(self.latency)
+        content = self.completion(payload["messages"][-1]["content"])
+        if payload.get("stream"):
+            words = content.split(" ")
+            events = [
+                {"choices": [{"delta": {"content": w if i == 0 else " " + w}}]}
+                for i, w in enumerate(words)
+            ]
+            body = "".join(f"data: {json.dumps(e)}\n\n" for e in events) + "data: [DONE]\n\n"
+            content_type = "text/event-stream"
+        else:
+            body = json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}]})
+            content_type = "application/json"
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_fake_llm(latency_ms, insufficient_rate):
+    FakeLLMHandler.latency = latency_ms / 1000
+    FakeLLMHandler.insufficient_rate = insufficient_rate
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeLLMHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fake_web_search(query, num=5):
+    return [
+        {"title": f"Result {i} for {query}",
+         "snippet": f"Background on {query}: reference material number {i} from an offline stand-in.",
+         "link": f"https://example.invalid/{i}?q={hashlib.md5(query.encode('utf-8')).hexdigest()[:8]}"}
+        for i in range(num)
+    ]
+
+
+# ---------------------------
+# Corpus + queries
+# ---------------------------
+NOUNS = ["pump", "valve", "sensor", "controller", "turbine", "filter", "relay", "bearing", "compressor", "gateway"]
+VERBS = ["regulates", "monitors", "reports", "limits", "stabilises", "calibrates", "protects", "measures"]
+QUALITIES = ["pressure", "temperature", "flow rate", "voltage", "vibration", "humidity", "torque", "latency"]
+OFF_TOPIC = [
+    "What is the capital of Peru?",
+    "Who painted the Sistine Chapel ceiling?",
+    "How many moons does Neptune have?",
+    "What year did the Berlin Wall fall?",
+    "What is the boiling point of ethanol?",
+]
+
+
+def synthetic_corpus(n_docs, sentences_per_doc, seed=0):
+    rnd = random.Random(seed)
+    docs = []
+    for d in range(n_docs):
+        sentences = []
+        for _ in range(sentences_per_doc):
+            model = f"{rnd.choice('ABCDEFGH')}{rnd.choice('XYZ')}-{rnd.randint(100, 999)}"
+            sentences.append(
+                f"The {model} {rnd.choice(NOUNS)} {rnd.choice(VERBS)} the {rnd.choice(QUALITIES)} "
+                f"of the {rnd.choice(NOUNS)} within {rnd.randint(1, 99)} percent."
+            )
+        docs.append((f"synthetic-{d}.txt", " ".join(sentences)))
+    return docs
+
+
+def load_corpus(directory):
+    docs = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        ext = os.path.splitext(name)[1].lower()
+        if ext in (".txt", ".md"):
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                docs.append((name, f.read()))
+        elif ext == ".pdf":
+            from core.pdf_extract import iter_pdf_pages
+            with open(path, "rb") as f:
+                docs.append((name, "\n".join(text for _, text in iter_pdf_pages(f))))
+    return docs
+
+
+def sample_queries(docs, n, seed=0):
+    rnd = random.Random(seed)
+    sentences = [s.strip() + "." for _, text in docs for s in text.split(".") if len(s.split()) > 5]
+    n_off = max(1, n // 4)
+    queries = [f"What does this say: {rnd.choice(sentences)}" for _ in range(n - n_off)]
+    queries += [OFF_TOPIC[i % len(OFF_TOPIC)] for i in range(n_off)]
+    rnd.shuffle(queries)
+    return queries
+
+
+# ---------------------------
+# Measurement helpers
+# ---------------------------
+def summarize(samples_ms):
+    if not samples_ms:
+        return {"n": 0}
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "n": len(values),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+class StageRecorder:
+    """Wraps the pipeline's stage functions to time each call of the current query."""
+
+    STAGES = ["cached_answer_fn", "retrieve_task_fn", "draft_task_fn", "improve_task_fn",
+              "fetch_fallback_fn", "merge_fallback_fn", "evaluate_task_fn"]
+
+    def __init__(self, module):
+        self.module = module
+        self.current = None
+        for name in self.STAGES:
+            setattr(module, name, self._wrap(name, getattr(module, name)))
+
+    def _wrap(self, name, fn):
+        def wrapper(*args, **kwargs):
+            result, elapsed = timed(fn, *args, **kwargs)
+            if self.current is not None:
+                self.current["ms"][name] = self.current["ms"].get(name, 0.0) + elapsed * 1000
+            return result
+        return wrapper
+
+    def start(self):
+        self.current = {"ms": {}}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="directory of .txt / .md / .pdf files (default: synthetic)")
+    parser.add_argument("--docs", type=int, default=20, help="synthetic documents")
+    parser.add_argument("--sentences", type=int, default=60, help="sentences per synthetic document")
+    parser.add_argument("--queries", help="file with one question per line (default: sampled)")
+    parser.add_argument("--n-queries", type=int, default=40)
+    parser.add_argument("--backend", choices=["qdrant", "local"], default="qdrant",
+                        help='vector store: in-memory Qdrant (":memory:") or the local NumPy index')
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated ms per completion")
+    parser.add_argument("--insufficient-rate", type=float, default=0.5,
+                        help="share of improve prompts the stand-in LLM rejects (drives the web fallback)")
+    parser.add_argument("--stream", action="store_true", help="stream draft answers")
+    parser.add_argument("--keep-answer-cache", action="store_true",
+                        help="do not clear the semantic answer cache between queries")
+    parser.add_argument("--json", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    # Point every backend at a local stand-in before the pipeline modules import config
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    server = start_fake_llm(args.llm_latency, args.insufficient_rate)
+    config.LM_STUDIO_URL = f"http://127.0.0.1:{server.server_address[1]}/v1/"
+    config.VECTOR_BACKEND = "qdrant"
+    config.QDRANT_URL = ":memory:"
+    config.LLM_CACHE_ENABLED = False
+    config.WEB_SEARCH_CACHE_PATH = os.path.join(workdir, "web_search_cache.sqlite")
+
+    from agents.search_fallback_agent import set_search_backend
+    from core.answer_cache import answer_cache
+    from core.embeddings import get_embeddings, semantic_chunk_text
+    from core.ingest_pipeline import ingest_stream
+    from core.qdrant_utils import ensure_collection, upsert_to_qdrant, set_vector_store
+    from core.vector_store import LocalVectorStore
+    import core.crew_rag_pipeline_conditional as pipeline
+
+    set_search_backend(fake_web_search)
+    if args.backend == "local":
+        set_vector_store(LocalVectorStore(None))
+
+    docs = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.docs, args.sentences)
+    get_embeddings(["warm up"])  # load the model outside the timings
+
+    # -------------------------
+    # Ingestion throughput
+    # -------------------------
+    chunked, chunk_s = timed(lambda: [(name, semantic_chunk_text(text)) for name, text in docs])
+    chunks = [c for _, cs in chunked for c in cs]
+    metas = [{"source": name} for name, cs in chunked for _ in cs]
+
+    batch = config.INGEST_EMBED_BATCH_SIZE
+    embeddings, embed_s = timed(
+        lambda: [v for i in range(0, len(chunks), batch) for v in get_embeddings(chunks[i:i + batch])]
+    )
+
+    ensure_collection("benchmark_upsert")
+    counts, upsert_s = timed(upsert_to_qdrant, "benchmark_upsert", chunks, metas, embeddings, False)
+
+    ensure_collection(BENCH_COLLECTION)
+    stream_chunks, stream_s = 0, 0.0
+    for name, text in docs:
+        out, elapsed = timed(ingest_stream, BENCH_COLLECTION, [(text, {})], name)
+        stream_chunks += out["added"] + out["skipped"]
+        stream_s += elapsed
+
+    ingest = {
+        "documents": len(docs),
+        "chunks": len(chunks),
+        "chunks_per_sec": len(chunks) / chunk_s if chunk_s else None,
+        "embeddings_per_sec": len(chunks) / embed_s if embed_s else None,
+        "upserts_per_sec": counts["added"] / upsert_s if upsert_s else None,
+        "ingest_stream_chunks_per_sec": stream_chunks / stream_s if stream_s else None,
+    }
+
+    # -------------------------
+    # Query latency
+    # -------------------------
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = sample_queries(docs, args.n_queries)
+
+    crew = pipeline.ConditionalRAGCrew(
+        collection=BENCH_COLLECTION,
+        agents=[pipeline.rag_agent, pipeline.answer_agent, pipeline.improver_agent,
+                pipeline.search_fallback_agent, pipeline.evaluator_agent],
+        tasks=[pipeline.retrieve_task, pipeline.draft_task, pipeline.improve_task,
+               pipeline.webfallback_task, pipeline.evaluate_task]
+    )
+    recorder = StageRecorder(pipeline)
+    on_token = (lambda token: None) if args.stream else None
+
+    stage_ms, branch_runs = {}, {}
+    for query in queries:
+        if not args.keep_answer_cache:
+            answer_cache.invalidate()
+        recorder.start()
+        result, total_s = timed(crew.kickoff, query, on_token)
+        run = recorder.current
+        run["ms"]["total"] = total_s * 1000
+        for stage, ms in run["ms"].items():
+            stage_ms.setdefault(stage, []).append(ms)
+        branch_runs.setdefault(result["trace"]["branch"], []).append(run["ms"])
+
+    report = {
+        "revision": git_revision(),
+        "settings": {
+            "backend": args.backend,
+            "llm_latency_ms": args.llm_latency,
+            "insufficient_rate": args.insufficient_rate,
+            "stream": args.stream,
+            "queries": len(queries),
+        },
+        "ingest": ingest,
+        "query": {
+            "stages": {stage: summarize(ms) for stage, ms in stage_ms.items()},
+            "branches": {
+                branch: {
+                    "count": len(runs),
+                    "stages": {
+                        stage: summarize([r[stage] for r in runs if stage in r])
+                        for stage in ["total"] + StageRecorder.STAGES if any(stage in r for r in runs)
+                    },
+                }
+                for branch, runs in branch_runs.items()
+            },
+        },
+    }
+    server.shutdown()
+
+    print(f"Ingest: {ingest['documents']} docs, {ingest['chunks']} chunks")
+    for key in ("chunks_per_sec", "embeddings_per_sec", "upserts_per_sec", "ingest_stream_chunks_per_sec"):
+        print(f"  {key:<30} {ingest[key] or 0:>10.1f}")
+    print(f"Queries: {len(queries)}")
+    print(f"  {'stage':<22} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, row in report["query"]["stages"].items():
+        print(f"  {stage:<22} {row['n']:>4} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+    for branch, row in report["query"]["branches"].items():
+        total = row["stages"]["total"]
+        print(f"  branch {branch:<20} {row['count']:>4} {total['p50_ms']:>9.1f} {total['p95_ms']:>9.1f} {total['p99_ms']:>9.1f}")
+
+    with open(args.json, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
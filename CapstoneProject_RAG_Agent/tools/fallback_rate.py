@@ -0,0 +1,106 @@
+# tools/fallback_rate.py
+"""
+Compare how often queries fall below the confidence thresholds (and so take
+the improve / web-fallback path) with dense-only vs hybrid retrieval.
+
+Confidence is computed as in the pipeline: the best "score" among the hits
+packed into the context from CONTEXT_CANDIDATES candidates. With hybrid it
+can differ from dense-only in two ways, reported separately: fusion packs
+different chunks, and the top sparse hit of a query naming an identifier
+gets HYBRID_IDENTIFIER_BONUS ("boosted" is the share of queries where that
+bonus set the confidence). "term match" is the share of queries with a
+packed chunk containing every query term.
+
+Both variants are built from the same corpus in an in-memory Qdrant:
+
+    python tools/fallback_rate.py --corpus ./data/sample_docs --queries ./data/sample_queries.txt
+
+--corpus is a directory of .txt / .md / .pdf files; --queries has one question per line.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+config.VECTOR_BACKEND = "qdrant"
+config.QDRANT_URL = ":memory:"  # never touch the real collection
+
+from core.embeddings import semantic_chunk_text
+from core.qdrant_utils import ensure_collection, upsert_to_qdrant, qdrant_query
+from core.context_packer import pack_context
+from core.sparse import lexical_coverage
+
+
+def load_corpus(directory):
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        ext = os.path.splitext(name)[1].lower()
+        if ext in (".txt", ".md"):
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                yield name, f.read()
+        elif ext == ".pdf":
+            from core.pdf_extract import iter_pdf_pages
+            with open(path, "rb") as f:
+                yield name, "\n".join(text for _, text in iter_pdf_pages(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", required=True)
+    parser.add_argument("--queries", required=True)
+    parser.add_argument("--topk", type=int, default=config.CONTEXT_CANDIDATES, help="candidates before packing")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.8, 0.6],
+                        help="confidence thresholds to report (kickoff uses 0.8, app.py 0.6)")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    variants = {"dense": False, "hybrid": True}
+    for collection, hybrid in variants.items():
+        ensure_collection(collection, hybrid=hybrid)
+
+    n_chunks = 0
+    for name, text in load_corpus(args.corpus):
+        chunks = semantic_chunk_text(text)
+        n_chunks += len(chunks)
+        for collection in variants:
+            upsert_to_qdrant(collection, chunks, [{"source": name} for _ in chunks])
+
+    report = {"queries": len(queries), "chunks": n_chunks, "variants": {}}
+    for collection in variants:
+        scores, term_matches, boosted = [], 0, 0
+        for q in queries:
+            hits = pack_context(qdrant_query(q, topk=args.topk, collection=collection))["hits"]
+            best = max(hits, key=lambda h: h["score"], default=None)
+            scores.append(best["score"] if best else 0.0)
+            boosted += best is not None and best["score"] > best.get("dense_score", best["score"])
+            term_matches += any(lexical_coverage(q, h["payload"]["text"]) == 1.0 for h in hits)
+        report["variants"][collection] = {
+            "mean_confidence": sum(scores) / len(scores) if scores else 0.0,
+            "term_match": term_matches / len(scores) if scores else 0.0,
+            "boosted": boosted / len(scores) if scores else 0.0,
+            "fallback_rate": {
+                str(t): sum(s < t for s in scores) / len(scores) if scores else 0.0
+                for t in args.thresholds
+            },
+        }
+
+    print(f"{len(queries)} queries over {n_chunks} chunks")
+    print(f"{'variant':<8} {'mean conf':>10} {'term match':>11} {'boosted':>8} "
+          + " ".join(f"{'< ' + str(t):>8}" for t in args.thresholds))
+    for collection, row in report["variants"].items():
+        rates = " ".join(f"{row['fallback_rate'][str(t)]:>8.1%}" for t in args.thresholds)
+        print(f"{collection:<8} {row['mean_confidence']:>10.3f} {row['term_match']:>11.1%} {row['boosted']:>8.1%} {rates}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
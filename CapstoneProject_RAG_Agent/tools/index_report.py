@@ -0,0 +1,158 @@
+# tools/index_report.py
+"""
+Recall vs latency of Qdrant index settings on our own collection.
+
+Copies the dense vectors of a collection into temporary collections on the
+same Qdrant server (one per quantization setting), then for each search-time
+ef measures recall@k against exact search and per-query latency:
+
+    python tools/index_report.py --collection my_collection --sample 200 --ef 32 64 128
+
+Queries are --queries (one question per line, embedded with the app's model)
+or, by default, --sample stored vectors. Needs a real Qdrant server: the
+in-process ":memory:" mode always searches exhaustively.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import QDRANT_URL, QDRANT_API_KEY, QDRANT_COLLECTION, HNSW_M, HNSW_EF_CONSTRUCT, VECTORS_ON_DISK
+from core.vector_store import QdrantVectorStore, DENSE_VECTOR
+
+VARIANTS = {
+    "float32": {"quantization": None},
+    "scalar": {"quantization": "scalar", "rescore": True, "oversampling": 2.0},
+    "scalar-norescore": {"quantization": "scalar", "rescore": False},
+    "binary": {"quantization": "binary", "rescore": True, "oversampling": 3.0},
+}
+
+
+def load_vectors(store, collection):
+    """All (id, dense vector) pairs of a collection."""
+    named = store.is_hybrid(collection)
+    points, offset = [], None
+    while True:
+        records, offset = store.client.scroll(
+            collection_name=collection, limit=1000, offset=offset,
+            with_payload=False, with_vectors=[DENSE_VECTOR] if named else True
+        )
+        for r in records:
+            points.append((r.id, r.vector[DENSE_VECTOR] if named else r.vector))
+        if offset is None:
+            return points
+
+
+def build_copy(store, name, points):
+    """Dense-only copy with the store's index settings, indexed before returning."""
+    m = store.models
+    if store.client.collection_exists(name):
+        store.client.delete_collection(name)
+    store.ensure_collection(name, hybrid=False)
+    # Build the HNSW graph and search it even for small collections: both
+    # thresholds are in KB, and indexing_threshold=0 would disable indexing
+    store.client.update_collection(
+        name,
+        optimizers_config=m.OptimizersConfigDiff(indexing_threshold=1),
+        hnsw_config=m.HnswConfigDiff(full_scan_threshold=1)
+    )
+    for start in range(0, len(points), 256):
+        store.client.upsert(
+            collection_name=name,
+            points=[m.PointStruct(id=pid, vector=vec) for pid, vec in points[start:start + 256]],
+            wait=True
+        )
+    while True:
+        info = store.client.get_collection(name)
+        if info.status == m.CollectionStatus.GREEN and (info.indexed_vectors_count or 0) >= len(points):
+            return
+        time.sleep(0.5)
+
+
+def search_ids(store, collection, vector, limit, params):
+    response = store.client.query_points(
+        collection_name=collection, query=vector, limit=limit,
+        with_payload=False, search_params=params
+    )
+    return [p.id for p in response.points]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", default=QDRANT_COLLECTION)
+    parser.add_argument("--queries", help="file with one question per line")
+    parser.add_argument("--sample", type=int, default=100, help="stored vectors to use as queries")
+    parser.add_argument("--topk", type=int, default=5)
+    parser.add_argument("--ef", type=int, nargs="+", default=[32, 64, 128])
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--keep", action="store_true", help="keep the temporary collections")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    base = QdrantVectorStore(QDRANT_URL, QDRANT_API_KEY)
+    points = load_vectors(base, args.collection)
+    if not points:
+        sys.exit(f"Collection {args.collection!r} is empty")
+
+    if args.queries:
+        from core.embeddings import embed_query
+        with open(args.queries, encoding="utf-8") as f:
+            query_vectors = [embed_query(line.strip()) for line in f if line.strip()]
+    else:
+        query_vectors = [vec for _, vec in random.Random(0).sample(points, min(args.sample, len(points)))]
+
+    report = {"collection": args.collection, "points": len(points), "queries": len(query_vectors),
+              "topk": args.topk, "results": []}
+    for variant in args.variants:
+        store = QdrantVectorStore(
+            QDRANT_URL, QDRANT_API_KEY, hnsw_m=HNSW_M, hnsw_ef_construct=HNSW_EF_CONSTRUCT,
+            on_disk=VECTORS_ON_DISK, **VARIANTS[variant]
+        )
+        name = f"{args.collection}__index_report_{variant.replace('-', '_')}"
+        build_copy(store, name, points)
+
+        exact = base.models.SearchParams(
+            exact=True, quantization=base.models.QuantizationSearchParams(ignore=True)
+        )
+        truth = [set(search_ids(store, name, q, args.topk, exact)) for q in query_vectors]
+        for ef in args.ef:
+            quantization = store.search_params.quantization if store.search_params else None
+            params = base.models.SearchParams(hnsw_ef=ef, quantization=quantization)
+            latencies, recalls = [], []
+            for q, expected in zip(query_vectors, truth):
+                started = time.perf_counter()
+                found = search_ids(store, name, q, args.topk, params)
+                latencies.append((time.perf_counter() - started) * 1000)
+                recalls.append(len(expected & set(found)) / len(expected) if expected else 1.0)
+            report["results"].append({
+                "variant": variant,
+                "ef": ef,
+                "recall": sum(recalls) / len(recalls),
+                "p50_ms": percentile(latencies, 0.50),
+                "p95_ms": percentile(latencies, 0.95),
+            })
+
+        if not args.keep:
+            store.client.delete_collection(name)
+
+    print(f"{len(query_vectors)} queries over {len(points)} points, recall@{args.topk} vs exact search")
+    print(f"{'variant':<18} {'ef':>5} {'recall':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for row in report["results"]:
+        print(f"{row['variant']:<18} {row['ef']:>5} {row['recall']:>8.3f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()